@@ -10,6 +10,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from app.core import FlaskApi, ApiException
 from app.utils import JSONEncoder
+from app.utils.cache import Generations
 from .utils.mixins import Anonymous
 
 version_ = (1, 8, 0)
@@ -26,6 +27,7 @@ mail = Mail()
 login_manager = LoginManager()
 jsonschema = JsonSchema()
 migrate = Migrate()
+generations = Generations(db)
 
 
 def create_app(config_name):
@@ -100,16 +102,25 @@ def create_app(config_name):
         :return:
         """
         g.user = current_user
+        g.pop('_auth_scopes', None)
     return app
 
 
+def _render_migration_item(type_, obj, autogen_context):
+    # models import the app package, resolve the hook when it is used
+    from app.models import render_migration_item
+    return render_migration_item(type_, obj, autogen_context)
+
+
 def init_extensions(app):
     db.init_app(app)
     mail.init_app(app)
     login_manager.init_app(app)
     login_manager.anonymous_user = Anonymous
     jsonschema.init_app(app)
-    migrate.init_app(app, db, directory=app.config['MIGRATIONS_DIR'])
+    migrate.init_app(app, db, directory=app.config['MIGRATIONS_DIR'],
+                     render_item=_render_migration_item)
+    generations.init_app(app)
 
 
 def init_routes(app):
@@ -21,10 +21,18 @@ from app.utils import addslashes, _HTTP_METHOD_TO_AUDIT_MAP
 @login_required
 @admin_required
 def before_api_request():
-    if 'application/json' not in request.accept_mimetypes:
+    if 'application/json' not in request.accept_mimetypes and \
+            'application/x-ndjson' not in request.accept_mimetypes:
         return errors.not_acceptable()
 
 
+def _audit_data():
+    # streamed bodies are read by the view, don't buffer them here
+    if request.mimetype == 'application/x-ndjson':
+        return ''
+    return addslashes(request.data.decode())
+
+
 @api.after_request
 def api_audit_log(response):
     """Saves information about the request in the ``audit_log``
@@ -37,7 +45,7 @@ def api_audit_log(response):
         'user': current_user.name,
         'email': current_user.email,
         'action': _HTTP_METHOD_TO_AUDIT_MAP[request.method.lower()],
-        'data': addslashes(request.data.decode()),
+        'data': _audit_data(),
         'url': request.url,
         'endpoint': request.endpoint,
         'ip': request.remote_addr,
@@ -1,6 +1,6 @@
 from flask import request, redirect, url_for
 from flask_jsonschema import validate
-from app.core import ApiResponse
+from app.core import ApiResponse, ApiStreamResponse
 from app import db
 from app.models import Asn
 from . import api
@@ -44,8 +44,7 @@ def get_asns():
     :status 200: Deliverable endpoint found, response may be empty
     :status 404: Not found
     """
-    asns = Asn.query.filter().all()
-    return ApiResponse({'asns': [a.serialize() for a in asns]})
+    return ApiStreamResponse('asns', Asn.query)
 
 
 @api.route('/asns/<int:asn_id>', methods=['GET'])
@@ -6,8 +6,8 @@
 from flask import request, redirect, url_for
 from flask_jsonschema import validate
 from app import db
-from app.core import ApiResponse
-from app.models import IpRange
+from app.core import ApiResponse, ApiStreamResponse
+from app.models import IpRange, Organization
 from . import api
 
 
@@ -54,8 +54,62 @@ def get_ip_ranges():
     :status 200: IP ranges endpoint found, response may be empty
     :status 404: Not found
     """
-    ips = IpRange.query.all()
-    return ApiResponse({'ip_ranges': [r.serialize() for r in ips]})
+    return ApiStreamResponse('ip_ranges', IpRange.query)
+
+
+@api.route('/ip_ranges/owner', methods=['GET'])
+@api.route('/ip-ranges/owner', methods=['GET'])
+def get_ip_range_owner():
+    """Return the most specific IP range containing ``address`` and the
+    organization owning it
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+        GET /api/1.0/ip-ranges/owner?address=158.168.149.17 HTTP/1.1
+        Host: do.cert.europa.eu
+        Accept: application/json
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+        HTTP/1.0 200 OK
+        Content-Type: application/json
+
+        {
+          "abbreviation": "CERT-EU",
+          "ip_range": {
+            "id": 1,
+            "ip_range": "158.168.149.0/24"
+          },
+          "organization_id": 185
+        }
+
+    :reqheader Accept: Content type(s) accepted by the client
+    :resheader Content-Type: this depends on `Accept` header or request
+
+    :query address: IP address or CIDR
+
+    :>json object ip_range: Most specific matching IP range
+    :>json integer organization_id: Organization ID
+    :>json string abbreviation: Organization abbreviation
+
+    :status 200: Owner found
+    :status 400: Invalid address
+    :status 404: No organization owns this address
+    """
+    try:
+        ip_range = IpRange.owner_of(request.args.get('address', ''))
+    except AttributeError as ae:
+        return ApiResponse({'message': str(ae)}, 400, {})
+    if not ip_range:
+        return ApiResponse({'message': 'Resource not found'}, 404, {})
+    org = Organization.query.get(ip_range.organization_id)
+    return ApiResponse({'ip_range': ip_range.serialize(),
+                        'organization_id': org.id,
+                        'abbreviation': org.abbreviation})
 
 
 @api.route('/ip_ranges/<int:range_id>', methods=['GET'])
@@ -160,8 +214,13 @@ def add_ip_range():
 
     :status 200: CIDR IP range was successfully added
     :status 400: Bad request
+    :status 422: Invalid IP range
     """
-    i = IpRange().from_json(request.json)
+    try:
+        i = IpRange().from_json(request.json)
+    except AttributeError as ae:
+        db.session.rollback()
+        return ApiResponse({'message': str(ae)}, 422, {})
     db.session.add(i)
     db.session.commit()
     return ApiResponse(
@@ -214,13 +273,18 @@ def update_ip_range(range_id):
 
     :status 200: IP range was successfully updated
     :status 400: Bad request
+    :status 422: Invalid IP range
     """
     i = IpRange.query.filter(
         IpRange.id == range_id
     ).first()
     if not i:
         return redirect(url_for('api.add_ip_range'))
-    i.from_json(request.json)
+    try:
+        i.from_json(request.json)
+    except AttributeError as ae:
+        db.session.rollback()
+        return ApiResponse({'message': str(ae)}, 422, {})
     db.session.add(i)
     db.session.commit()
     return ApiResponse({'message': 'IP range saved'})
@@ -1,11 +1,12 @@
-import ipaddress
-from flask import request, redirect, url_for, current_app
+from flask import request, redirect, url_for, current_app, json, \
+    Response, stream_with_context
 from flask_jsonschema import validate
 from sqlalchemy.exc import IntegrityError
-from app.core import ApiResponse, ApiException
+from app.core import ApiResponse, ApiStreamResponse, ApiException, \
+    requested_fields
 from . import api
 from ..import db
-from ..models import Organization, Email, ContactEmail
+from ..models import Organization, Email, ContactEmail, IpRange
 
 
 @api.route('/organizations', methods=['GET'])
@@ -67,6 +68,9 @@ def get_organizations():
           ]
         }
 
+    :query fields: Comma separated fields to return, e.g.
+        ``id,abbreviation``. Other fields are not loaded at all.
+
     :reqheader Accept: Content type(s) accepted by the client
     :reqheader API-Authorization: API key. If present authentication and
         authorization will be attempted.
@@ -85,8 +89,16 @@ def get_organizations():
     :status 403: Access denied. Authorization will not help and the request
         SHOULD NOT be repeated.
     """
-    orgs = Organization.query.all()
-    return ApiResponse({'organizations': [o.serialize() for o in orgs]})
+    fields = requested_fields(Organization)
+    query = Organization.query
+    if fields:
+        query = query.options(
+            *Organization.field_options(fields, collections=False))
+    # streamed in batches, each batch is preloaded with a query per relation
+    return ApiStreamResponse(
+        'organizations', query,
+        serialize=lambda o: o.serialize(fields=fields),
+        preload=lambda orgs: Organization.preload(orgs, collections=True))
 
 
 @api.route('/organizations/<int:org_id>', methods=['GET'])
@@ -144,6 +156,9 @@ def get_organization(org_id):
 
     :param org_id: organization unique ID
 
+    :query fields: Comma separated fields to return, e.g.
+        ``id,abbreviation``. Other fields are not loaded at all.
+
     :reqheader Accept: Content type(s) accepted by the client
     :reqheader API-Authorization: API key. If present authentication and
             authorization will be attempted.
@@ -176,8 +191,11 @@ def get_organization(org_id):
     :status 403: Access denied. Authorization will not help and the request
         SHOULD NOT be repeated.
     """
-    o = Organization.query.get_or_404(org_id)
-    return ApiResponse(o.serialize())
+    fields = requested_fields(Organization)
+    query = Organization.query.options(
+        *Organization.query_options(fields, 'detail'))
+    o = query.get_or_404(org_id)
+    return ApiResponse(o.serialize(fields=fields))
 
 
 @api.route('/organizations/<string:org_abbr>', methods=['GET'])
@@ -236,6 +254,9 @@ def get_organization_by_abbr(org_abbr):
 
     :param org_abbr: organization abbreviation
 
+    :query fields: Comma separated fields to return, e.g.
+        ``id,abbreviation``. Other fields are not loaded at all.
+
     :reqheader Accept: Content type(s) accepted by the client
     :reqheader API-Authorization: API key. If present authentication and
             authorization will be attempted.
@@ -268,8 +289,11 @@ def get_organization_by_abbr(org_abbr):
     :status 403: Access denied. Authorization will not help and the request
         SHOULD NOT be repeated.
     """
-    o = Organization.query.filter_by(abbreviation=org_abbr).first_or_404()
-    return ApiResponse(o.serialize())
+    fields = requested_fields(Organization)
+    query = Organization.query.options(
+        *Organization.query_options(fields, 'detail'))
+    o = query.filter_by(abbreviation=org_abbr).first_or_404()
+    return ApiResponse(o.serialize(fields=fields))
 
 
 @api.route('/organizations', methods=['POST', 'PUT'])
@@ -367,6 +391,7 @@ def add_organization():
 
     :status 200: Organization details were successfully updated
     :status 400: Bad request
+    :status 422: Invalid IP range
     :status 401: Authorization failure. The client MAY repeat the request with
         a suitable API-Authorization header field. If the request already
         included Authorization credentials, then the 401 response indicates
@@ -375,7 +400,11 @@ def add_organization():
         SHOULD NOT be repeated.
     """
     contact_emails = request.json.pop('contact_emails')
-    o = Organization.fromdict(request.json)
+    try:
+        o = Organization.fromdict(request.json)
+    except AttributeError as ae:
+        db.session.rollback()
+        return ApiResponse({'message': str(ae)}, 422, {})
     try:
         for e in contact_emails:
             cp = e.get('cp', False)
@@ -493,6 +522,7 @@ def update_organization(org_id):
 
     :status 200: Organization details were successfully updated
     :status 400: Bad request
+    :status 422: Invalid IP range
     :status 401: Authorization failure. The client MAY repeat the request with
         a suitable API-Authorization header field. If the request already
         included Authorization credentials, then the 401 response indicates
@@ -507,7 +537,11 @@ def update_organization(org_id):
         return redirect(url_for('api.add_organization'))
     contact_emails = request.json.pop('contact_emails', [])
     abuse_emails = request.json.pop('abuse_emails', [])
-    o.from_json(request.json)
+    try:
+        o.from_json(request.json)
+    except AttributeError as ae:
+        db.session.rollback()
+        return ApiResponse({'message': str(ae)}, 422, {})
     for c in o.contact_emails:
         try:
             Email.query.filter_by(email=c.email).delete()
@@ -649,7 +683,9 @@ def check_constituents():
     :resheader Content-Type: this depends on `Accept` header or request
 
     :<jsonarr string ip_address: IP addresses to check
-    :>json object response: Dictonary of IP and organization abbreviation
+    :>json object response: Dictonary of IP and organization abbreviation.
+        If several ranges contain an IP, the most specific one wins.
+        Invalid addresses are left out.
 
     :status 200: Organizations or empty object
     :status 401: Authorization failure. The client MAY repeat the request with
@@ -659,18 +695,110 @@ def check_constituents():
     :status 403: Access denied. Authorization will not help and the request
         SHOULD NOT be repeated.
     """
-    rv = {}
-    orgs = Organization.query.all()
-    if not orgs:
-        return ApiResponse({}, 204)
-    for o in orgs:
-        for cidr in o.ip_ranges:
-            cidr_range = ipaddress.ip_network(cidr, strict=False)
-            for ip in request.json:
-                ipa = ipaddress.ip_address(ip.strip())
-                if ipa in cidr_range:
-                    rv[ip] = o.abbreviation
-    if rv:
-        return ApiResponse({'response': rv})
-    else:
+    matches = {}
+    for ip, org_id in zip(request.json,
+                          IpRange.index().lookup_many(request.json)):
+        if org_id is not None:
+            matches[ip] = org_id
+    if not matches:
         return ApiResponse({}, 204)
+
+    abbreviations = dict(
+        db.session.query(Organization.id, Organization.abbreviation).
+        filter(Organization.id.in_(set(matches.values()))))
+    rv = {ip: abbreviations[org_id] for ip, org_id in matches.items()}
+    return ApiResponse({'response': rv})
+
+
+@api.route('/organizations/check/stream', methods=['POST', 'PUT'])
+def stream_check_constituents():
+    """Resolve a stream of IP addresses or CIDRs to organizations
+
+    The request body is read line by line, one JSON string (or bare
+    address) per line. Lines are resolved in batches of
+    ``NDJSON_BATCH_SIZE`` and results are written back as soon as a batch
+    is done, one JSON object per input line and in the same order. Memory
+    use does not depend on the size of the input.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+        POST /api/1.0/organizations/check/stream HTTP/1.1
+        Host: do.cert.europa.eu
+        Accept: application/x-ndjson
+        Content-Type: application/x-ndjson
+        Transfer-Encoding: chunked
+
+        "212.8.189.19"
+        "1.2.3.4"
+        "212.8.189.16/29"
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+        HTTP/1.0 200 OK
+        Content-Type: application/x-ndjson
+
+        {"address": "212.8.189.19", "organization_id": 185, "abbreviation": "CERT-EU", "abuse_emails": ["cert-eu@ec.europa.eu"]}
+        {"address": "1.2.3.4", "organization_id": null}
+        {"address": "212.8.189.16/29", "organization_id": 185, "abbreviation": "CERT-EU", "abuse_emails": ["cert-eu@ec.europa.eu"]}
+
+    :reqheader Content-Type: application/x-ndjson
+    :resheader Content-Type: application/x-ndjson
+
+    :>json string address: Address as sent
+    :>json integer organization_id: Owner with the most specific range,
+        ``null`` if there is none
+    :>json string abbreviation: Organization abbreviation
+    :>json array abuse_emails: Abuse e-mails of the organization
+    :>json string error: Set if the line is not an IP address or CIDR
+
+    :status 200: Results are streamed
+    """
+    batch_size = current_app.config['NDJSON_BATCH_SIZE']
+    index = IpRange.index()
+    stream = request.stream
+    invalid = object()
+
+    def resolve(batch):
+        org_ids = []
+        for address in batch:
+            try:
+                org_ids.append(index.lookup(address))
+            except ValueError:
+                org_ids.append(invalid)
+        contacts = Organization.abuse_contacts(
+            {i for i in org_ids if i is not None and i is not invalid})
+
+        lines = []
+        for address, org_id in zip(batch, org_ids):
+            item = {'address': address, 'organization_id': None}
+            if org_id is invalid:
+                item['error'] = 'invalid address'
+            elif org_id is not None:
+                item['organization_id'] = org_id
+                item.update(contacts[org_id])
+            lines.append(json.dumps(item))
+        return '\n'.join(lines) + '\n'
+
+    def generate():
+        batch = []
+        for line in stream:
+            line = line.decode('utf-8', 'replace').strip()
+            if not line:
+                continue
+            try:
+                address = json.loads(line)
+            except ValueError:
+                address = line
+            batch.append(address if isinstance(address, str) else line)
+            if len(batch) >= batch_size:
+                yield resolve(batch)
+                batch = []
+        if batch:
+            yield resolve(batch)
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson')
@@ -1,5 +1,7 @@
-from app.core.api import ApiResponse, ApiPagedResponse, FlaskApi
+from app.core.api import ApiResponse, ApiPagedResponse, ApiStreamResponse
+from app.core.api import FlaskApi
 from app.core.api import ApiException, ApiValidationException
+from app.core.api import requested_fields
 
-__all__ = ['ApiResponse', 'ApiPagedResponse', 'FlaskApi',
-           'ApiException', 'ApiValidationException']
+__all__ = ['ApiResponse', 'ApiPagedResponse', 'ApiStreamResponse', 'FlaskApi',
+           'ApiException', 'ApiValidationException', 'requested_fields']
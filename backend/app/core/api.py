@@ -1,5 +1,7 @@
 from flask import Flask
-from flask import Response, request, json, url_for
+from itertools import islice
+from flask import Response, request, json, url_for, current_app, \
+    stream_with_context
 
 
 class FlaskApi(Flask):
@@ -38,6 +40,102 @@ class ApiResponse:
                           self.status, self.headers)
 
 
+class ApiStreamResponse(ApiResponse):
+    """ApiResponse for large collections. Returns ``{key: [items]}`` like
+    :class:`ApiResponse`, but the array is written while the items are
+    read, so memory does not grow with the collection.
+
+    The first batch is read and serialized when the response is created,
+    inside the view, so failing queries or serializers still end in an
+    error response. A later failure can't change the status any more, it
+    is logged and the connection is dropped, so clients see an incomplete
+    transfer. An empty collection is answered with ``200`` and
+    ``{key: []}``, not with ``204`` as an empty :class:`ApiResponse`.
+
+    :param key: Name of the array in the response object
+    :param body: :class:`~flask_sqlalchemy.BaseQuery` or iterable of items.
+        Queries are read with ``yield_per``, they must not eager load
+        collections.
+    :param status: Response status code as defined in RFC 2616
+    :param headers: Dictionary of additional headers
+    :param serialize: Turns an item into JSON data, ``item.serialize()``
+        by default
+    :param preload: Called with every batch of items before they are
+        serialized, e.g. :meth:`~app.models.Organization.preload`
+    :param batch_size: Items read and written at once, defaults to
+        ``API_STREAM_BATCH_SIZE``
+    """
+    def __init__(self, key, body, status=200, headers={}, serialize=None,
+                 preload=None, batch_size=None):
+        super().__init__(body, status, headers)
+        self.key = key
+        self.serialize = serialize or (lambda item: item.serialize())
+        self.preload = preload
+        self.batch_size = batch_size or \
+            current_app.config['API_STREAM_BATCH_SIZE']
+        items = body
+        if hasattr(items, 'yield_per'):
+            items = items.yield_per(self.batch_size)
+        self._batches = self._encode(iter(items))
+        self._first = next(self._batches, None)
+
+    def _encode(self, iterator):
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            if self.preload:
+                batch = self.preload(batch)
+            yield ', '.join(json.dumps(self.serialize(item))
+                            for item in batch)
+
+    def to_response(self):
+        def generate():
+            yield '{%s: [' % json.dumps(self.key)
+            if self._first is not None:
+                yield self._first
+                try:
+                    for batch in self._batches:
+                        yield ', ' + batch
+                except Exception:
+                    current_app.log.exception(
+                        'Streaming {} failed, response truncated'.format(
+                            self.key))
+                    raise
+            yield ']}'
+
+        rv = Response(stream_with_context(generate()),
+                      status=self.status,
+                      mimetype='application/json')
+        rv.headers.extend(self.headers)
+        return rv
+
+    def __repr__(self):
+        fmt = '{}({!r}, {}, status={}, headers={})'
+        return fmt.format(self.__class__.__name__, self.key, repr(self.body),
+                          self.status, self.headers)
+
+
+def requested_fields(model):
+    """Public names of ``model`` in the ``fields`` argument of the request,
+    e.g. ``?fields=id,abbreviation``. Pass them to
+    :meth:`~app.utils.mixins.SerializerMixin.field_options` and
+    :meth:`~app.utils.mixins.SerializerMixin.serialize`.
+
+    :raises ApiException: if a name is not public
+    :return: tuple of names, ``None`` if all fields are requested
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    fields = tuple(f.strip() for f in fields.split(',') if f.strip())
+    try:
+        model.field_options(fields)
+    except ValueError as e:
+        raise ApiException('Unknown fields: ' + ', '.join(e.args[1]))
+    return fields or None
+
+
 class ApiPagedResponse(ApiResponse):
     """Paged ApiResponse.
 
@@ -49,6 +147,9 @@ class ApiPagedResponse(ApiResponse):
     :param filterfn: Filter function to be applied to each item
     :param exclude: list or tuple of fields to be excluded from
                     serialization
+    :raises ApiException: if the ``fields`` argument names unknown fields.
+        It is checked here, inside the view, so the error becomes a 400
+        response.
     """
     def __init__(self, body, status=200, headers={}, max_per_page=20,
                  filterfn=None, exclude=None):
@@ -56,14 +157,22 @@ class ApiPagedResponse(ApiResponse):
         self.maxperpage = max_per_page
         self.filterfn = filterfn
         self.exclude = exclude
+        self.model = body.column_descriptions[0]['type']
+        self.fields = requested_fields(self.model)
 
     def to_response(self):
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', self.maxperpage, type=int),
                        self.maxperpage)
-        paged = self.body.paginate(page, per_page)
-
-        items = [i.serialize(self.exclude) for i in paged.items]
+        query = self.body
+        model = self.model
+        fields = self.fields
+        if fields:
+            query = query.options(*model.field_options(fields))
+        paged = query.paginate(page, per_page)
+
+        items = [i.serialize(self.exclude, fields=fields)
+                 for i in model.preload(paged.items)]
 
         if self.filterfn:
             items = list(map(self.filterfn, items))
@@ -23,6 +23,7 @@ from . import membership_roles, countries, organization_memberships, users  # no
 from . import errors  # noqa
 from . import fody  # noqa
 from . import grafana  # noqa
+from . import ip_ranges  # noqa
 
 app = Flask(__name__)
 app.config.from_envvar('DO_LOCAL_CONFIG')
@@ -11,14 +11,27 @@ from requests.utils import unquote
 @cp.route('/ripe/handle/<string:ripe_org_hdl>', methods=['GET'])
 def get_cp_ripe_handle(ripe_org_hdl):
     try:
-        fody_org = FodyOrganization(ripe_org_hdl)
+        fody_org = FodyOrganization.get(ripe_org_hdl)
         return ApiResponse(fody_org.__dict__)
     except AttributeError as ae:
         return ApiResponse({'message': str(ae) ,}, 404, {})
 
+@cp.route('/ripe/settings/<int:org_id>', methods=['GET'])
+def get_cp_org_settings(org_id):
+    """Notification settings of all ripe handles of an organization,
+    keyed by handle"""
+    o = Organization.query.options(
+        *Organization.loader_profile('auth-check')).get_or_404(org_id)
+    if not g.user.may_handle_organization(o):
+        abort(403)
+
+    settings = FodyOrg_X_Organization.notification_settings_for([o.id])
+    return ApiResponse({'ripe_settings': settings[o.id]})
+
 @cp.route('/ripe/settings/<int:org_id>/<string:ripe_org_hdl>', methods=['GET'])
 def get_cp_settings(ripe_org_hdl, org_id):
-    o = Organization.query.get_or_404(org_id)
+    o = Organization.query.options(
+        *Organization.loader_profile('auth-check')).get_or_404(org_id)
     if not g.user.may_handle_organization(o):
         abort(403)
 
@@ -36,7 +49,8 @@ def get_cp_settings(ripe_org_hdl, org_id):
 
 @cp.route('/ripe/settings/<int:org_id>/<string:ripe_org_hdl>', methods=['PUT', 'POST'])
 def set_cp_settings(ripe_org_hdl, org_id):
-    o = Organization.query.get_or_404(org_id)
+    o = Organization.query.options(
+        *Organization.loader_profile('auth-check')).get_or_404(org_id)
     if not g.user.may_handle_organization(o):
         abort(403)
 
@@ -46,26 +60,46 @@ def set_cp_settings(ripe_org_hdl, org_id):
     except NoResultFound:
         abort(404)
 
-    try:
-        setting = request.json
+    setting = request.json
+    if isinstance(setting, list):
+        settings = setting
+    else:
+        settings = [setting]
+    for s in settings:
+        if not isinstance(s, dict) or \
+                not isinstance(s.get('notification_setting') or {}, dict):
+            return ApiResponse(
+                {'message': 'Expected a setting object or a list of them'},
+                422, {})
 
-        forg_x_org.upsert_notification_setting(**setting)
+    try:
+        # a list of settings is applied at once, all or nothing
+        if isinstance(setting, list):
+            forg_x_org.upsert_notification_settings(setting)
+        else:
+            forg_x_org.upsert_notification_setting(**setting)
         db.session.commit()
     except TypeError as e:
         return ApiResponse({'message': str(e) ,}, 421, {})
     except AttributeError as e:
         return ApiResponse({'message': str(e) ,}, 421, {})
 
+    if isinstance(setting, list):
+        return ApiResponse({'message': 'Settings added'}, 201, {})
     return ApiResponse({'message': 'Setting added'}, 201, {})
 
 @cp.route('/ripe/contact', methods=['GET'])
 def get_cp_contact_for_netblock():
     cidr = request.args.get('cidr')
-    if not cidr:
+    asn = request.args.get('asn')
+    if not cidr and not asn:
         return ApiResponse({'message': 'no cidr defined' ,}, 404, {})
-    cidr = unquote(cidr)
     try:
-        notification_setting = NotificationSetting.contact_for_netblock(cidr)
+        if cidr:
+            notification_setting = \
+                NotificationSetting.contact_for_netblock(unquote(cidr))
+        else:
+            notification_setting = NotificationSetting.contact_for_asn(asn)
     except AttributeError as e:
         return ApiResponse({'message': str(e) ,}, 404, {})
     except Exception as e:
@@ -73,3 +107,19 @@ def get_cp_contact_for_netblock():
 
     return ApiResponse(notification_setting)
 
+
+@cp.route('/ripe/contacts', methods=['POST'])
+def get_cp_contacts():
+    """Batch variant of ``/ripe/contact``: post ``{"asns": [...],
+    "cidrs": [...]}``, unknown or invalid entries map to ``null``.
+    """
+    lookups = request.json or {}
+    contacts = {'asns': {}, 'cidrs': {}}
+    for key, lookup in (('asns', NotificationSetting.contact_for_asn),
+                        ('cidrs', NotificationSetting.contact_for_netblock)):
+        for value in lookups.get(key, []):
+            try:
+                contacts[key][str(value)] = lookup(value)
+            except (AttributeError, ValueError):
+                contacts[key][str(value)] = None
+    return ApiResponse(contacts)
@@ -2,12 +2,45 @@ from flask import g, request, abort
 from app.core import ApiResponse
 from app import db
 from . import cp
-from flask import Response, current_app
+from flask import Response, current_app, json
+from http import cookiejar
+from collections import namedtuple
+import hashlib
 import requests
-from app.models import Organization, FodyOrganization
+from requests.adapters import HTTPAdapter
+from app.utils import replace_stream
+from app.utils.cache import LRUCache
+from app.models import Organization, FodyOrg_X_Organization
 
 
-def _proxy(url, replace = False):
+class _BlockCookies(cookiejar.DefaultCookiePolicy):
+    """Keep Grafana cookies out of the shared session, they belong to the
+    user whose request is proxied and are passed on in the headers
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+#: upstream session per worker, connections to Grafana are kept alive
+_session = None
+
+
+def _upstream():
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.cookies.set_policy(_BlockCookies())
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=current_app.config['GRAFANA_POOL_SIZE'])
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+
+def _fetch(url, exclude_headers=()):
     grafana_url = ("%s:%s/" % (
        current_app.config['GRAFANA_HOST'],
        current_app.config['GRAFANA_PORT']
@@ -15,54 +48,115 @@ def _proxy(url, replace = False):
 
     grafana_url += url
 
-    request_headers = {key: value for (key, value) in request.headers  if key != 'Host'}
+    exclude_headers = {'host'} | set(exclude_headers)
+    request_headers = {key: value for (key, value) in request.headers
+                       if key.lower() not in exclude_headers}
     request_headers['X_GRAFANA_REMOTE_USER'] =  current_app.config['GRAFANA_REMOTE_USER']
-    resp = requests.request(
+    return _upstream().request(
         method=request.method,
         url=grafana_url,  # request.url.replace(request.host_url, 'orf.at'),
         headers=request_headers,
         data=request.get_data(),
-        cookies=request.cookies,
-        allow_redirects=False)
+        allow_redirects=False,
+        stream=True)
 
-    excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
+
+def _stream(resp, replace = False):
+    chunk_size = current_app.config['GRAFANA_CHUNK_SIZE']
+    excluded_headers = ['transfer-encoding', 'connection']
+    if replace:
+        # the rewritten body is decoded and its length changes
+        excluded_headers += ['content-encoding', 'content-length']
+        content = replace_stream(resp.iter_content(chunk_size),
+                                 b"/grafana/", b"/proxy/")
+    else:
+        # pass the body through as sent, compressed or not
+        content = resp.raw.stream(chunk_size, decode_content=False)
     headers = [(name, value) for (name, value) in resp.raw.headers.items()
                if name.lower() not in excluded_headers]
 
     # headers.append(('Access-Control-Allow-Origin', 'http://localhost:3005/'))
-    # content = c.replace("/grafana/", "http://localhost:3005/")
-    if replace:
-        c = resp.content.decode('utf-8')
-        content = c.replace("/grafana/", "/proxy/")
-    else:
-        content = resp.content
-    response = Response(content, resp.status_code, headers)
-    # print("*** ", grafana_url, resp.status_code)
+    response = Response(content, resp.status_code, headers,
+                        direct_passthrough=True)
+    # hand the connection back to the pool once the body is sent
+    response.call_on_close(resp.close)
     return response
 
-# /statistics?orgid=123
-@cp.route('/statistics', methods=['GET'])
-def get_grafana():
-    orgid = request.args.get('orgid', type = int)
 
+#: ``(etag, headers, body)`` of a cached Grafana asset
+_Asset = namedtuple('_Asset', ['etag', 'headers', 'body'])
+
+#: static Grafana assets per worker, keyed by path
+_assets = None
+
+
+def _asset_cache():
+    global _assets
+    if _assets is None:
+        # limited by the bytes of the cached bodies
+        _assets = LRUCache(
+            maxsize=current_app.config['GRAFANA_STATIC_CACHE_BYTES'],
+            ttl=current_app.config['GRAFANA_STATIC_CACHE_TTL'],
+            weigh=lambda asset: len(asset.body))
+    return _assets
+
+
+def _static_asset(url):
+    """Serve a static Grafana asset from :func:`_asset_cache`. The ETag is
+    the SHA-256 of the body, so clients revalidate with ``If-None-Match``
+    and get a ``304`` without Grafana being asked.
+    """
+    cache = _asset_cache()
+    asset = cache.get(url)
+    if asset is None:
+        # the full body is needed, not a 304 for the client's copy
+        resp = _fetch(url, ('if-none-match', 'if-modified-since'))
+        max_size = current_app.config['GRAFANA_STATIC_MAX_SIZE']
+        length = resp.headers.get('content-length')
+        if resp.status_code != 200 or \
+                (length and length.isdigit() and int(length) > max_size):
+            return _stream(resp)
+        try:
+            body = resp.content
+        finally:
+            resp.close()
+        headers = [(name, value) for (name, value) in resp.headers.items()
+                   if name.lower() in ('content-type', 'last-modified')]
+        asset = _Asset(hashlib.sha256(body).hexdigest(), headers, body)
+        if len(body) <= max_size:
+            cache.set(url, asset)
+
+    response = Response(asset.body, 200, asset.headers)
+    response.set_etag(asset.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = \
+        current_app.config['GRAFANA_STATIC_MAX_AGE']
+    return response.make_conditional(request)
+
+
+def _proxy(url, replace = False):
+    if not replace and request.method == 'GET' and \
+            url.startswith(tuple(current_app.config['GRAFANA_STATIC_PATHS'])):
+        return _static_asset(url)
+    return _stream(_fetch(url), replace)
+
+def _statistics_asns(orgid):
     if orgid:
-        o = Organization.query.get_or_404(orgid)
+        o = Organization.query.options(
+            *Organization.loader_profile('auth-check')).get_or_404(orgid)
         if not g.user.may_handle_organization(o):
             abort(403)
-        ripe_handles = o.ripe_organizations
-        asns = [FodyOrganization(r.ripe_org_hdl).asns for r in ripe_handles]
+        org_ids = [o.id]
     else:
-        orgs = g.user.get_organizations_raw()
-        ripe_handles = []
-        asns = []
-        for org in orgs:
-            o = Organization.query.get(org['id'])
-            ripe_handles = o.ripe_organizations
-            for r in ripe_handles:
-                a = FodyOrganization(r.ripe_org_hdl).asns
-                if a:
-                     asns.append(a)
+        org_ids = [org['id'] for org in g.user.get_organizations_raw()]
 
+    return FodyOrg_X_Organization.asns_for(org_ids)
+
+# /statistics?orgid=123
+@cp.route('/statistics', methods=['GET'])
+def get_grafana():
+    orgid = request.args.get('orgid', type = int)
+    asns = _statistics_asns(orgid)
 
     # http://localhost:3005/d/QA7iWe9iz/teshboard?orgId=1&asn=1
 
@@ -72,12 +166,62 @@ def get_grafana():
        current_app.config['GRAFANA_OPTIONS'],
     ))
 
-    for asn_list in asns:
-       for asn in asn_list:
-           grafana_url += '&var-asn='+asn
+    if len(asns) > current_app.config['GRAFANA_MAX_URL_ASNS'] and \
+            current_app.config['GRAFANA_ASN_DATASOURCE']:
+        # too long for an URL, the dashboard queries the ASNs of the scope
+        # from /statistics/datasource/search
+        grafana_url += '&var-asnscope=' + (str(orgid) if orgid else 'all')
+    else:
+        grafana_url += ''.join('&var-asn=' + asn for asn in asns)
+
+    return ApiResponse({'statistics_url': grafana_url,
+                        'asn_count': len(asns)})
+
+# Grafana JSON datasource (simple JSON protocol) for the ``asn`` variable
+@cp.route('/statistics/datasource/', methods=['GET'])
+def get_statistics_datasource():
+    """Connection test of the Grafana JSON datasource"""
+    return ApiResponse({'message': 'OK'})
+
+@cp.route('/statistics/datasource/search', methods=['POST'])
+def search_statistics_datasource():
+    """ASNs of a statistics scope as Grafana variable values
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+        POST /cp/1.0/statistics/datasource/search HTTP/1.1
+        Content-Type: application/json
+
+        {"target": "123"}
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+        HTTP/1.0 200 OK
+        Content-Type: application/json
 
+        ["12635", "29429"]
 
-    return ApiResponse({'statistics_url': grafana_url})
+    :<json string target: ``var-asnscope`` of the statistics URL, an
+        organization ID or ``all`` for all organizations of the user
+    :status 200: ASNs of the scope, possibly none
+    :status 400: Invalid scope
+    :status 403: Access denied to the organization
+    """
+    target = str((request.get_json(silent=True) or {}).get('target') or '')
+    target = target.strip()
+    orgid = None
+    if target not in ('', 'all'):
+        try:
+            orgid = int(target)
+        except ValueError:
+            return ApiResponse({'message': 'Invalid scope'}, 400, {})
+    # an array even if empty, ApiResponse would answer 204
+    return Response(json.dumps(list(_statistics_asns(orgid))), 200,
+                    mimetype='application/json')
 
 @cp.route('/proxy/<path:dummy>', methods=['GET', 'POST'])
 def proxy(dummy):
@@ -0,0 +1,52 @@
+from flask import g, request
+from app.core import ApiResponse
+from app.models import IpRange, Organization
+from . import cp
+
+
+@cp.route('/ip_ranges/owner', methods=['GET'])
+def get_cp_ip_range_owner():
+    """Return the most specific IP range containing ``address`` among the
+    organizations of the current user
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+        GET /cp/1.0/ip_ranges/owner?address=158.168.149.17 HTTP/1.1
+        Host: cp.cert.europa.eu
+        Accept: application/json
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+        HTTP/1.0 200 OK
+        Content-Type: application/json
+
+        {
+          "abbreviation": "CERT-EU",
+          "ip_range": {
+            "id": 1,
+            "ip_range": "158.168.149.0/24"
+          },
+          "organization_id": 185
+        }
+
+    :query address: IP address or CIDR
+
+    :status 200: Owner found
+    :status 400: Invalid address
+    :status 404: None of the user's organizations owns this address
+    """
+    try:
+        ip_range = IpRange.owner_of(request.args.get('address', ''),
+                                    g.user.auth_scope.org_ids)
+    except AttributeError as ae:
+        return ApiResponse({'message': str(ae)}, 400, {})
+    if not ip_range:
+        return ApiResponse({'message': 'Resource not found'}, 404, {})
+    org = Organization.query.get(ip_range.organization_id)
+    return ApiResponse({'ip_range': ip_range.serialize(),
+                        'organization_id': org.id,
+                        'abbreviation': org.abbreviation})
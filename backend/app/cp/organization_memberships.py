@@ -264,7 +264,9 @@ def check_membership_permissions(membership):
     """ The current user must be able to admin both the membership's
     organization and its user.
     """
-    org = Organization.query.get_or_404(membership.organization_id)
+    org = Organization.query.options(
+        *Organization.loader_profile('auth-check')).get_or_404(
+        membership.organization_id)
     user = User.query.get_or_404(membership.user_id)
     if not g.user.may_handle_organization(org):
         abort(403)
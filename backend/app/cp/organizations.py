@@ -1,6 +1,6 @@
-from flask import g, abort, request, url_for, send_file
+from flask import g, abort, request, url_for, send_file, current_app, json
 from flask_jsonschema import validate
-from app.core import ApiResponse
+from app.core import ApiResponse, requested_fields
 from app import db, app
 from app.models import Organization, Permission, ContactEmail, Email, User
 from app.api.decorators import permission_required
@@ -9,6 +9,31 @@ from . import cp
 import psycopg2
 import sqlalchemy.exc
 import os
+import base64
+
+#: Upper bound for ``per_page`` of keyset paginated listings
+MAX_PER_PAGE = 1000
+
+
+def _encode_cursor(org):
+    key = [org['depth'], org['abbreviation'] or '', org['id']]
+    return base64.urlsafe_b64encode(
+        json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Return the ``(depth, abbreviation, id)`` keyset of ``cursor``
+
+    :raises ValueError: if the cursor was not issued by us
+    """
+    padded = cursor + '=' * (-len(cursor) % 4)
+    key = json.loads(base64.urlsafe_b64decode(padded).decode('utf-8'))
+    if not isinstance(key, list) or len(key) != 3 or \
+            not isinstance(key[0], int) or not isinstance(key[1], str) or \
+            not isinstance(key[2], int):
+        raise ValueError('Invalid cursor', cursor)
+    return tuple(key)
+
 
 @cp.route('/organizations', methods=['GET'])
 def get_cp_organizations():
@@ -76,10 +101,23 @@ def get_cp_organizations():
           "status": "not found"
         }
 
+    Without query parameters all organizations are returned. Pass
+    ``per_page`` (and the ``next_cursor`` of the previous response as
+    ``cursor``) to page through large subtrees. Pages are ordered by
+    depth, abbreviation and id.
+
     :reqheader Accept: Content type(s) accepted by the client
     :resheader Content-Type: this depends on `Accept` header or request
+    :resheader Link: Link to the next page, if any
+
+    :query per_page: Number of organizations per page
+    :query cursor: ``next_cursor`` of the previous page
+    :query count: Set to ``1`` to also return the total number
 
     :>json array organizations: List of available organization objects
+    :>json string next_cursor: Cursor of the next page, ``null`` on the
+        last page. Only for paginated requests.
+    :>json integer count: Total number of organizations, if requested
 
     For organization details: :http:get:`/api/1.0/organizations/(int:org_id)`
 
@@ -93,12 +131,34 @@ def get_cp_organizations():
         SHOULD NOT be repeated.
     """
 
-    # needs limit, count, offset
-    # orgs = g.user.get_organizations()
-    # return ApiResponse({'organizations': [o.serialize() for o in orgs]})
-    orgs = g.user.get_organizations_raw()
-    return ApiResponse({'organizations': orgs}) # 'pager': {'page': 1, 'maxpage})
-#    return ApiResponse(o.serialize())
+    per_page = request.args.get('per_page', type=int)
+    cursor = request.args.get('cursor')
+    with_count = request.args.get('count') in ('1', 'true')
+    if per_page is None and cursor is None and not with_count:
+        orgs = g.user.get_organizations_raw()
+        return ApiResponse({'organizations': orgs})
+
+    per_page = min(per_page or current_app.config['ITEMS_PER_PAGE'],
+                   MAX_PER_PAGE)
+    if per_page < 1:
+        return ApiResponse({'message': 'per_page must be positive'}, 400, {})
+    try:
+        after = _decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return ApiResponse({'message': 'Invalid cursor'}, 400, {})
+
+    orgs, has_more, total = g.user.get_organizations_page(
+        per_page, after, with_count)
+    body = {'organizations': orgs, 'next_cursor': None}
+    headers = {}
+    if has_more:
+        body['next_cursor'] = _encode_cursor(orgs[-1])
+        headers['Link'] = '<{}>; rel="Next"'.format(
+            url_for(request.endpoint, per_page=per_page,
+                    cursor=body['next_cursor'], _external=True))
+    if total is not None:
+        body['count'] = total
+    return ApiResponse(body, 200, headers)
 
 
 @cp.route('/organizations/<int:org_id>', methods=['GET'])
@@ -156,6 +216,8 @@ def get_cp_organization(org_id):
         }
 
     :param org_id: organization unique ID
+    :query fields: Comma separated fields to return, e.g.
+        ``id,abbreviation``. Other fields are not loaded at all.
 
     :reqheader Accept: Content type(s) accepted by the client
     :reqheader API-Authorization: API key. If present authentication and
@@ -190,14 +252,18 @@ def get_cp_organization(org_id):
     :status 403: Access denied. Authorization will not help and the request
         SHOULD NOT be repeated.
     """
-    o = Organization.query.get_or_404(org_id)
+    fields = requested_fields(Organization)
+    query = Organization.query.options(
+        *Organization.query_options(fields, 'detail'))
+    o = query.get_or_404(org_id)
     if not g.user.may_handle_organization(o):
         abort(403)
-    return ApiResponse(o.serialize())
+    return ApiResponse(o.serialize(fields=fields))
 
 @cp.route('/organizations/<int:org_id>/download_events', methods=['GET'])
 def get_cp_organization_events(org_id):
-    o = Organization.query.get_or_404(org_id)
+    o = Organization.query.options(
+        *Organization.loader_profile('auth-check')).get_or_404(org_id)
     if not g.user.may_handle_organization(o):
         abort(403)
 
@@ -322,6 +388,7 @@ def add_cp_organization():
 
     :status 200: Organization details were successfully updated
     :status 400: Bad request
+    :status 422: Invalid IP range
     :status 401: Authorization failure. The client MAY repeat the request with
         a suitable API-Authorization header field. If the request already
         included Authorization credentials, then the 401 response indicates
@@ -329,7 +396,11 @@ def add_cp_organization():
     :status 403: Access denied. Authorization will not help and the request
         SHOULD NOT be repeated.
     """
-    o = Organization.fromdict(request.json)
+    try:
+        o = Organization.fromdict(request.json)
+    except AttributeError as ae:
+        db.session.rollback()
+        return ApiResponse({'message': str(ae)}, 422, {})
 
     parent_org = Organization.query.get(o.parent_org_id)
     if not parent_org or not g.user.may_handle_organization(parent_org):
@@ -451,6 +522,7 @@ def update_cp_organization(org_id):
 
     :status 200: Organization details were successfully updated
     :status 400: Bad request
+    :status 422: Invalid IP range
     :status 422: Validation error
     """
     o = Organization.query.filter(
@@ -484,7 +556,11 @@ def update_cp_organization(org_id):
         db.session.refresh
         return ApiResponse({'message': str(ie) ,}, 421, {})
 
-    o.from_json(request.json)
+    try:
+        o.from_json(request.json)
+    except AttributeError as ae:
+        db.session.rollback()
+        return ApiResponse({'message': str(ae)}, 422, {})
     o.contact_emails = []
     o.abuse_emails = []
 
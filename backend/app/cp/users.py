@@ -335,7 +335,9 @@ def add_cp_user():
     # admin the organization.
     request_membership = request.json['organization_membership']
     request_membership['user_id'] = user.id
-    org = Organization.query.get_or_404(request_membership['organization_id'])
+    org = Organization.query.options(
+        *Organization.loader_profile('auth-check')).get_or_404(
+        request_membership['organization_id'])
     role_id = request_membership['membership_role_id']
     role = MembershipRole.query.get_or_404(role_id)
 
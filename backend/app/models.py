@@ -5,15 +5,21 @@ import binascii
 import hashlib
 import random
 import csv
+import ipaddress
+import bisect
+from collections import namedtuple, OrderedDict
 import yaml
 from urllib.error import HTTPError
 import onetimepass
-from app import db, login_manager, config
-from sqlalchemy import desc, event, text, or_, UniqueConstraint
-from sqlalchemy.orm import aliased, deferred
+from app import db, login_manager, config, generations
+from sqlalchemy import desc, event, text, or_, UniqueConstraint, DDL
+from sqlalchemy.orm import aliased, deferred, validates, load_only, \
+    joinedload, subqueryload
+from sqlalchemy.orm.attributes import get_history, set_committed_value
+from sqlalchemy.types import UserDefinedType
 from sqlalchemy.dialects import postgres
 from flask_sqlalchemy import BaseQuery
-from flask import current_app, request
+from flask import current_app, request, g, has_request_context
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.hybrid import hybrid_property
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -21,6 +27,8 @@ from flask_login import UserMixin
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired
 from itsdangerous import BadTimeSignature, TimedJSONWebSignatureSerializer
 from app.utils.mixins import SerializerMixin
+from app.utils.cache import LRUCache
+from app.utils.ipindex import IntervalIndex
 from app.utils.inflect import pluralize
 from validate_email import validate_email
 from app.utils.mail import send_email
@@ -41,6 +49,8 @@ print = functools.partial(print, flush=True)
 #: we need to load the configuration from the config module
 _config = config.get(os.getenv('DO_CONFIG') or 'default')
 
+_MISSING = object()
+
 def check_phonenumber(phonenumber):
     try:
         if not phonenumber:
@@ -90,6 +100,53 @@ emails_organizations = db.Table(
     ),
     # db.UniqueConstraint('email_id', 'organization_id', name='eo_idx')
 )
+
+
+class Ltree(UserDefinedType):
+    """PostgreSQL ``ltree`` label path, needs the ``ltree`` extension"""
+
+    def get_col_spec(self):
+        return 'LTREE'
+
+
+def render_migration_item(type_, obj, autogen_context):
+    """Alembic ``render_item`` hook, autogenerated migrations import
+    :class:`Ltree` instead of referring to ``app.models`` unimported
+    """
+    if type_ == 'type' and isinstance(obj, Ltree):
+        autogen_context.imports.add('from app.models import Ltree')
+        return 'Ltree()'
+    return False
+
+
+#: Transitive closure of ``organizations.parent_org_id``: one row for every
+#: (ancestor, descendant) pair including the organization itself (depth 0).
+#: Maintained by the ``Organization`` mapper events below.
+organization_closure = db.Table(
+    'organization_closure', db.metadata,
+    db.Column(
+        'ancestor_id',
+        db.Integer,
+        db.ForeignKey('organizations.id', ondelete='CASCADE'),
+        primary_key=True
+    ),
+    db.Column(
+        'descendant_id',
+        db.Integer,
+        db.ForeignKey('organizations.id', ondelete='CASCADE'),
+        primary_key=True
+    ),
+    db.Column('depth', db.Integer, nullable=False),
+    db.Index('ix_organization_closure_descendant_id',
+             'descendant_id', 'ancestor_id'),
+)
+#: generations of cached data, see :mod:`app.utils.cache`
+cache_generations = db.Table(
+    'cache_generations', db.metadata,
+    db.Column('name', db.String(64), primary_key=True),
+    db.Column('generation', db.BigInteger, nullable=False, default=0)
+)
+
 tags_vulnerabilities = db.Table(
     'tags_vulnerabilities', db.metadata,
     db.Column('id', db.Integer, primary_key=True),
@@ -294,12 +351,6 @@ class User(UserMixin, Model, SerializerMixin):
     _reset_token_valid_to = db.Column(db.DateTime)
     _login_timestamp = db.Column('login_timestamp', db.DateTime)
 
-    _orgs = []
-    _org_ids = []
-    _organizations_list = []
-    multi_tree_org_id = []
-    multi_tree_org_raw = []
-
     aliased_users = db.relationship('User')
 
     user_memberships = db.relationship(
@@ -612,14 +663,19 @@ class User(UserMixin, Model, SerializerMixin):
             return role
 
 
+    @property
+    def auth_scope(self):
+        """:class:`AuthScope` of this user, computed once per request"""
+        return AuthScope.for_user(self)
+
     def may_handle_user(self, user):
         """checks if the user object it is called on
            (which MUST be an OrgAdmin)
             may manipulate the user of the parameter list
         """
-        oms = self.get_organization_memberships()
+        org_ids = self.auth_scope.org_ids
         for um in user.user_memberships:
-           if um.organization_id in self.multi_tree_org_id:
+           if um.organization_id in org_ids:
               return True
         return False
 
@@ -637,135 +693,137 @@ class User(UserMixin, Model, SerializerMixin):
            (which MUST be an OrgAdmin)
             may manipulate the organization of the parameter list
         """
-        self.get_organization_memberships()
-        if org.id in self.multi_tree_org_id:
-            return True
-        return False
+        scope = AuthScope.cached(self)
+        if scope is not None:
+            return org.id in scope.org_ids
+
+        # single query instead of building the whole scope
+        row = db.session.execute(
+            text("""select o.path is null,
+                           exists (
+                    select 1
+                      from organizations r
+                      join organization_memberships m
+                           on m.organization_id = r.id
+                      join membership_roles mr
+                           on mr.id = m.membership_role_id
+                     where o.path <@ r.path
+                       and mr.name = 'OrgAdmin'
+                       and m.deleted = 0
+                       and m.user_id in (select id from users
+                                          where id = :b_user_id
+                                             or alias_user_id = :b_user_id))
+                      from organizations o
+                     where o.id = :b_org_id
+            """), {'b_org_id': org.id, 'b_user_id': self.id}).first()
+        if row is None:
+            return False
+        no_path, allowed = row
+        if no_path:
+            # inserted outside the ORM, see manage.py rebuild_org_closure
+            return org.id in self.auth_scope.org_ids
+        return allowed
 
-    _tree_cache = {};
+    @staticmethod
+    def _org_subtrees(root_ids):
+        """All organizations below (and including) ``root_ids``
 
-    '''
-    def _org_tree_iterator(self, org_id):
-        if org_id in self._tree_cache:
-           self._tree_cache[org_id] += 1
-        else:
-           self._tree_cache[org_id] = 1
-
-        sub_orgs = Organization.query.filter_by(parent_org_id = org_id)
-        for sub_org in sub_orgs:
-           # print(sub_org.full_name + str(sub_org.id))
-           self._orgs.append(sub_org.organization_memberships)
-           self._org_ids.append(sub_org.id)
-           self._org_tree_iterator(sub_org.id)
-    '''
+        Overlapping subtrees are expanded once, every organization is
+        returned a single time with its minimal depth below any root.
+        Deleted organizations are included.
+        """
+        results = db.session.execute(
+                text("""select distinct on (o.id)
+                              o.id,
+                              o.abbreviation,
+                              o.full_name,
+                              o.display_name,
+                              o.deleted,
+                              o.parent_org_id,
+                              case when c.depth = 0 then 'n/a'::text
+                                   else p.abbreviation::text
+                              end parent_org_abbreviation,
+                              c.depth
+                         from organization_closure c
+                         join organizations o on o.id = c.descendant_id
+                    left join organizations p on p.id = o.parent_org_id
+                   where c.ancestor_id = any(:b_root_ids)
+                   order by o.id, c.depth
+                """), {'b_root_ids': list(root_ids)})
+
+        keys = results.keys()
+        rows = [dict(zip(keys, r)) for r in results.fetchall()]
+        rows.sort(key=lambda r: (r['depth'], r['id']))
+        return rows
+
+    def _admin_memberships(self):
+        """OrgAdmin memberships of this user and all its alias users"""
+        admin_role = self.get_role_by_name('OrgAdmin')
 
-    def _org_tree_raw(self, org_id, limit = 1000, offset = 0):
-        results = db.engine.execute(
-                text("""with recursive sub_orgs as (
-                              select id,
-                              abbreviation,
-                              full_name,
-                              display_name,
-                              deleted,
-                              parent_org_id,
-                              'n/a'::text parent_org_abbreviation,
-                              0 depth
-                         from organizations
-                   where id = :b_parent_org_id
-                   union
-                   select distinct o.id, o.abbreviation, o.full_name, o.display_name, o.deleted, o.parent_org_id, s.abbreviation::text, s.depth + 1 from organizations o
-                   join sub_orgs s ON s.id = o.parent_org_id)
-                   select * from sub_orgs where deleted = 0 limit :b_limit offset :b_offset
-                """), {'b_parent_org_id': org_id, 'b_limit': limit, 'b_offset': offset});
-
-        self._organizations_list = []
-
-        for r in results.fetchall():
-            h = {}
-            for i, k in enumerate(results.keys()):
-                h[k] = r[i]
-
-            self._organizations_list.append(h)
-        return self._organizations_list
-
-    def _org_tree(self, org_id, limit = 1000, offset = 0):
-        results = db.engine.execute(
-                text("""with recursive sub_orgs as (select id, abbreviation, full_name, display_name, deleted, parent_org_id, 'n/a'::text, 0 depth from organizations
-                   where id = :b_parent_org_id
-                   union
-                   select o.id, o.abbreviation, o.full_name, o.display_name, o.deleted, o.parent_org_id, s.abbreviation::text, s.depth + 1 from organizations o
-                   join sub_orgs s ON s.id = o.parent_org_id)
-                   select * from sub_orgs limit :b_limit offset :b_offset
-                """), {'b_parent_org_id': org_id, 'b_limit': limit, 'b_offset': offset});
-
-        self._org_ids = []
-        for row in results:
-            self._org_ids.append(row[0])
-        return self._org_ids
- 
+        stmt_user_ids = db.session.query(User.id). \
+            filter(or_(User.id == self.id, User.alias_user_id == self.id)).subquery()
+        return OrganizationMembership.query. \
+            filter(OrganizationMembership.user_id.in_(stmt_user_ids)). \
+            filter_by(membership_role_id = admin_role.id, deleted = 0).all()
 
     def get_organization_memberships(self):
         """ returns a list of OrganizationMembership records"""
         """ self MUST be a logged in admin, we find all nodes (and subnodes)
             where the user is admin an return ALL memeberships of those nodes
             in the org tree """
-        admin_role = self.get_role_by_name('OrgAdmin')
-        
-        stmt_user_ids = db.session.query(User.id). \
-            filter(or_(User.id == self.id, User.alias_user_id == self.id)).subquery()
-        orgs_admins = OrganizationMembership.query. \
-            filter(OrganizationMembership.user_id.in_(stmt_user_ids)). \
-            filter_by(membership_role_id = admin_role.id, deleted = 0).all()
-
-        if (not orgs_admins):
+        scope = self.auth_scope
+        if not scope.org_ids:
            return []
 
-        self._orgs = [orgs_admins]
-        self._org_ids = [org.organization.id for org in orgs_admins]
-
-        # find all orgs where the org.id is the parent_org_id recursivly
-        #  for org in orgs_admin:
-        
-        self.multi_tree_org_id = []  
-        self.multi_tree_org_raw = []  
-        for oa in orgs_admins:
-           # self._org_tree_iterator(oa.organization_id)
-           self.multi_tree_org_id.extend(self._org_tree(oa.organization_id))
-           self.multi_tree_org_raw.extend(self._org_tree_raw(oa.organization_id))
-
-        oms = OrganizationMembership.query.filter( \
-                     OrganizationMembership.organization_id.in_(self.multi_tree_org_id)) \
-                     .filter(OrganizationMembership.deleted == 0)
-        return oms
+        return OrganizationMembership.query.filter( \
+                     OrganizationMembership.id.in_(scope.membership_ids))
 
     def get_organizations(self, limit = 1000, offset = 0):
         """returns a list of Organization records"""
-        oms = self.get_organization_memberships()
-        if not self._org_ids:
+        scope = self.auth_scope
+        if not scope.org_ids:
             return []
-        return Organization.query.filter(Organization.id.in_(self.multi_tree_org_id)) \
+        return Organization.query.filter(Organization.id.in_(scope.org_ids)) \
                     .limit(limit).offset(offset)
 
     def get_organizations_raw(self, limit = 5, offset = 0):
         """returns a list of Organization records"""
-        oms = self.get_organization_memberships()
-        if not self._org_ids:
-            return []
-        return self.multi_tree_org_raw
+        return [dict(o) for o in self.auth_scope.organizations]
+
+    def get_organizations_page(self, per_page, after = None,
+                               with_count = False):
+        """Keyset paginated variant of :meth:`get_organizations_raw`
+
+        Organizations are ordered by ``(depth, abbreviation, id)``. The
+        order is resolved once per :class:`AuthScope` (see
+        :attr:`AuthScope.page_keys`), a page only seeks to ``after``.
+
+        :param per_page: Maximum number of organizations to return
+        :param after: ``(depth, abbreviation, id)`` of the last organization
+            of the previous page
+        :param with_count: Also count all organizations of the scope
+        :return: ``(organizations, has_more, total)``, ``total`` is
+            ``None`` unless ``with_count`` is set
+        """
+        scope = self.auth_scope
+        start = 0
+        if after is not None:
+            start = bisect.bisect_right(scope.page_keys, tuple(after))
+        page = scope.page_order[start:start + per_page + 1]
+
+        has_more = len(page) > per_page
+        organizations = [dict(o) for o in page[:per_page]]
+        total = len(scope.page_keys) if with_count else None
+        return organizations, has_more, total
 
     def get_users(self):
         """returns a list of unique User records"""
-        oms = self.get_organization_memberships()
-        # for om in oms:
-        users = []
-        ud = {}
-        for om in oms:
-            if om.user.id not in ud:
-                if om.user.deleted != 1:
-                    users.append(om.user)                
-                ud[om.user.id] = 1
-
-        return users
+        scope = self.auth_scope
+        if not scope.user_ids:
+            return []
+        users = User.query.filter(User.id.in_(scope.user_ids)) \
+                    .order_by(User.id)
+        return [u for u in users if u.deleted != 1]
 
     def get_memberships(self, membership_id = None):
         """returns all memeberships for user"""
@@ -777,6 +835,112 @@ class User(UserMixin, Model, SerializerMixin):
     def is_authenticated(self):
         print(self.name)
 
+class AuthScope(namedtuple('AuthScope', ['user_id', 'root_ids', 'org_ids',
+                                             'membership_ids', 'user_ids',
+                                             'organizations', 'page_order',
+                                             'page_keys'])):
+    """Immutable authorization scope of an OrgAdmin.
+
+    :attr root_ids: ``frozenset`` of the organizations the user (or one of
+        its alias users) is OrgAdmin for
+    :attr org_ids: ``frozenset`` of all organizations in the subtrees the
+        user (or one of its alias users) is OrgAdmin for
+    :attr membership_ids: ``frozenset`` of the active memberships of those
+        organizations
+    :attr user_ids: ``frozenset`` of the users of those memberships
+    :attr organizations: ``tuple`` of the non deleted organizations as
+        returned by :meth:`User.get_organizations_raw`
+    :attr page_order: ``organizations`` ordered by ``(depth, abbreviation,
+        id)`` for :meth:`User.get_organizations_page`
+    :attr page_keys: ``tuple`` of the ``(depth, abbreviation, id)`` keys
+        of ``page_order``, to be searched with :mod:`bisect`
+
+    Scopes are cached across requests in :attr:`cache`, keyed by user id
+    and the ``org_tree`` generation. Writes to the org tree or to
+    memberships bump that generation on commit (see :meth:`invalidate`).
+    Inside a request the scope is additionally kept on :data:`flask.g`.
+    """
+    __slots__ = ()
+
+    #: process wide cache of computed scopes
+    cache = LRUCache(maxsize=_config.AUTH_SCOPE_CACHE_SIZE)
+
+    @classmethod
+    def for_user(cls, user):
+        if user.id is None:
+            return cls.compute(user)
+        if has_request_context():
+            scopes = g.setdefault('_auth_scopes', {})
+            if user.id in scopes:
+                return scopes[user.id]
+
+        if generations.pending(db.session, 'org_tree'):
+            # uncommitted writes, don't share what we see
+            scope = cls.compute(user)
+        else:
+            key = (user.id, generations.get('org_tree'))
+            scope = cls.cache.get(key)
+            if scope is None:
+                scope = cls.compute(user)
+                cls.cache.set(key, scope)
+
+        if has_request_context():
+            scopes[user.id] = scope
+        return scope
+
+    @classmethod
+    def cached(cls, user):
+        """The scope of ``user`` if it was already computed, else ``None``"""
+        if user.id is None:
+            return None
+        if has_request_context() and user.id in g.get('_auth_scopes', {}):
+            return g._auth_scopes[user.id]
+        if generations.pending(db.session, 'org_tree'):
+            return None
+        return cls.cache.get((user.id, generations.get('org_tree')))
+
+    @classmethod
+    def compute(cls, user):
+        root_ids = frozenset(oa.organization_id
+                             for oa in user._admin_memberships())
+        if not root_ids:
+            return cls(user.id, frozenset(), frozenset(), frozenset(),
+                       frozenset(), (), (), ())
+
+        subtrees = User._org_subtrees(root_ids)
+        org_ids = frozenset(o['id'] for o in subtrees)
+        organizations = [o for o in subtrees if o['deleted'] == 0]
+        page_order = sorted(organizations, key=cls._page_key)
+
+        memberships = db.session.query(OrganizationMembership.id,
+                                       OrganizationMembership.user_id). \
+            filter(OrganizationMembership.organization_id.in_(org_ids)). \
+            filter(OrganizationMembership.deleted == 0).all()
+
+        return cls(user.id,
+                   root_ids,
+                   org_ids,
+                   frozenset(m.id for m in memberships),
+                   frozenset(m.user_id for m in memberships),
+                   tuple(organizations),
+                   tuple(page_order),
+                   tuple(cls._page_key(o) for o in page_order))
+
+    @staticmethod
+    def _page_key(org):
+        return (org['depth'], org['abbreviation'] or '', org['id'])
+
+    @staticmethod
+    def invalidate(target):
+        """Drop all scopes once the session of ``target`` commits
+
+        :param target: Written Organization, OrganizationMembership or User
+        """
+        generations.mark(target, 'org_tree')
+        if has_request_context():
+            g.pop('_auth_scopes', None)
+
+
 class Permission:
     """Permissions pseudo-model. Uses 8 bits to assign permissions.
     Each permission is assigned a bit possion and for each role the
@@ -881,8 +1045,89 @@ class IpRange(Model, SerializerMixin):
     query_class = FilteredQuery
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'))
-    ip_range = db.Column(db.String(255))
+    ip_range = db.Column(postgres.CIDR)
     deleted = db.Column(db.Integer, default=0)
+    __table_args__ = (
+        db.Index('ix_ip_ranges_ip_range', 'ip_range',
+                 postgresql_using='gist',
+                 postgresql_ops={'ip_range': 'inet_ops'}),
+    )
+
+    @validates('ip_range')
+    def validate_ip_range(self, key, ip_range):
+        """Store ranges in canonical form, host bits are dropped
+        (``1.2.3.4/24`` becomes ``1.2.3.0/24``)
+        """
+        if ip_range is None:
+            return None
+        try:
+            return str(ipaddress.ip_network(ip_range.strip(), strict=False))
+        except ValueError:
+            raise AttributeError('invalid IP range', ip_range)
+
+    @classmethod
+    def owner_of(cls, address, org_ids = None):
+        """Most specific range containing ``address``, matched in SQL
+
+        :param address: IP address or CIDR
+        :param org_ids: Only consider ranges of these organizations
+        :return: :class:`IpRange` or ``None``
+        """
+        try:
+            address = str(ipaddress.ip_network(address.strip(),
+                                               strict=False))
+        except ValueError:
+            raise AttributeError('invalid IP address', address)
+        query = cls.query. \
+            join(Organization, Organization.id == cls.organization_id). \
+            filter(Organization.deleted == 0). \
+            filter(cls.ip_range.op('>>=')(db.cast(address, postgres.INET)))
+        if org_ids is not None:
+            if not org_ids:
+                return None
+            query = query.filter(cls.organization_id.in_(org_ids))
+        return query.order_by(db.func.masklen(cls.ip_range).desc()).first()
+
+    #: ``(generation, IntervalIndex)`` built by :meth:`index`
+    _index = None
+
+    @classmethod
+    def index(cls):
+        """:class:`~app.utils.ipindex.IntervalIndex` of the ranges of all
+        active organizations, values are organization ids.
+        Rebuilt whenever the ``ip_ranges`` generation changes.
+        """
+        if generations.pending(db.session, 'ip_ranges'):
+            return cls._build_index()
+        generation = generations.get('ip_ranges')
+        cached = cls._index
+        if cached is None or cached[0] != generation:
+            cached = (generation, cls._build_index())
+            cls._index = cached
+        return cached[1]
+
+    @classmethod
+    def _build_index(cls):
+        rows = db.session.query(cls.ip_range, cls.organization_id). \
+            join(Organization, Organization.id == cls.organization_id). \
+            filter(cls.deleted == 0, Organization.deleted == 0)
+        networks = []
+        for ip_range, organization_id in rows:
+            try:
+                networks.append((ipaddress.ip_network(ip_range.strip(),
+                                                      strict=False),
+                                 organization_id))
+            except ValueError:
+                current_app.logger.warning(
+                    'Ignoring invalid IP range %r', ip_range)
+        return IntervalIndex(networks)
+
+
+@event.listens_for(IpRange, 'after_insert')
+@event.listens_for(IpRange, 'after_update')
+@event.listens_for(IpRange, 'after_delete')
+def _ip_range_index_invalidate(mapper, connection, target):
+    generations.mark(target, 'ip_ranges')
 
 
 class FodyOrg_X_Organization(Model, SerializerMixin):
@@ -914,20 +1159,26 @@ class FodyOrg_X_Organization(Model, SerializerMixin):
     # you have to handle it in the caller
     @ripe_org_hdl.setter
     def ripe_org_hdl(self, ripe_org_hdl):
-        self.fody_org = FodyOrganization(ripe_org_hdl = ripe_org_hdl)
+        self.fody_org = FodyOrganization.get(ripe_org_hdl)
         self._ripe_org_hdl = self.fody_org.ripe_org_hdl
 
     @property
     def notification_settings(self):
-    #    return self._notification_settings
-
+        # same settings and order as notification_settings_for
         nss = NotificationSetting.query \
                 .filter_by(ripe_org_hdl=self.ripe_org_hdl,
-                           organization_id=self.organization_id ).all()
+                           organization_id=self.organization_id,
+                           deleted=0) \
+                .order_by(NotificationSetting.id).all()
 
-        notification_settings = {}
-        self.fody_org = FodyOrganization(ripe_org_hdl = self.ripe_org_hdl)
+        self.fody_org = FodyOrganization.get(self.ripe_org_hdl)
+        self._notification_settings = \
+            self._settings_view(self.fody_org, nss)
+        return self._notification_settings
 
+    @staticmethod
+    def _settings_view(fody_org, nss):
+        """ASNs and CIDRs of ``fody_org`` with their notification settings"""
         ns_dict = {}
         for ns in nss:
             key = ns.asn if ns.asn else ns.cidr
@@ -936,18 +1187,94 @@ class FodyOrg_X_Organization(Model, SerializerMixin):
                    'delivery_format':       ns.delivery_format,
                    'notification_interval': ns.notification_interval}
 
-        def get_ns_dict(k):
-            if k in ns_dict:
-                return ns_dict[k]
-            else:
-                return {}
+        notification_settings = {}
+        notification_settings['asns'] = [{'asn': k, 'notification_setting': ns_dict.get(k, {})} for k in fody_org.asns]
+        notification_settings['cidrs'] = [{'cidr': k, 'notification_setting': ns_dict.get(k, {})} for k in fody_org.cidrs]
+        notification_settings['abusecs'] = fody_org.abusecs
+        notification_settings['name'] = fody_org.name
+        return notification_settings
 
-        notification_settings['asns'] = [{'asn': k,  'notification_setting': get_ns_dict(k)}  for k in self.fody_org.asns]
-        notification_settings['cidrs'] = [{'cidr': k, 'notification_setting': get_ns_dict(k)}  for k in self.fody_org.cidrs]
-        notification_settings['abusecs'] = self.fody_org.abusecs
-        notification_settings['name'] = self.fody_org.name
-        self._notification_settings = notification_settings
-        return self._notification_settings
+    @staticmethod
+    def notification_settings_for(org_ids):
+        """:attr:`notification_settings` of all ripe handles of many
+        organizations, from one joined query and the cached fody data
+
+        :param org_ids: Organization IDs
+        :return: dict of ``organization_id: {ripe_org_hdl: settings}``,
+            handles unknown to fody are left out
+        """
+        org_ids = list(org_ids)
+        if not org_ids:
+            return {}
+        rows = db.session.query(FodyOrg_X_Organization, NotificationSetting). \
+            outerjoin(NotificationSetting, db.and_(
+                NotificationSetting.organization_id ==
+                FodyOrg_X_Organization.organization_id,
+                NotificationSetting.ripe_org_hdl ==
+                FodyOrg_X_Organization._ripe_org_hdl,
+                NotificationSetting.deleted == 0)). \
+            filter(FodyOrg_X_Organization.organization_id.in_(org_ids),
+                   FodyOrg_X_Organization.deleted == 0). \
+            order_by(FodyOrg_X_Organization.id, NotificationSetting.id)
+
+        nss = OrderedDict()
+        for forg_x_org, ns in rows:
+            key = (forg_x_org.organization_id, forg_x_org.ripe_org_hdl)
+            nss.setdefault(key, [])
+            if ns is not None:
+                nss[key].append(ns)
+
+        fody_orgs = FodyOrganization.load_many(
+            ripe_org_hdl for _, ripe_org_hdl in nss)
+        settings = {org_id: {} for org_id in org_ids}
+        for (org_id, ripe_org_hdl), org_nss in nss.items():
+            if ripe_org_hdl in fody_orgs:
+                settings[org_id][ripe_org_hdl] = \
+                    FodyOrg_X_Organization._settings_view(
+                        fody_orgs[ripe_org_hdl], org_nss)
+        return settings
+
+    #: process wide cache of :meth:`asns_for`, keyed by organization ids
+    #: and the ``fody`` and ``fody_links`` generations
+    asn_cache = LRUCache(maxsize=_config.ASN_SET_CACHE_SIZE)
+
+    @staticmethod
+    def asns_for(org_ids):
+        """Sorted, deduplicated ASNs of the ripe handles of ``org_ids``,
+        e.g. an admin's whole subtree, computed with one query over the
+        fody tables and cached per set of organizations
+
+        :return: tuple of ASN strings
+        """
+        org_ids = tuple(sorted(set(org_ids)))
+        if not org_ids:
+            return ()
+        if generations.pending(db.session, 'fody_links'):
+            return FodyOrg_X_Organization._asns_for(org_ids)
+        key = (org_ids, generations.get('fody'),
+               generations.get('fody_links'))
+        asns = FodyOrg_X_Organization.asn_cache.get(key)
+        if asns is None:
+            asns = FodyOrg_X_Organization._asns_for(org_ids)
+            FodyOrg_X_Organization.asn_cache.set(key, asns)
+        return asns
+
+    @staticmethod
+    def _asns_for(org_ids):
+        results = db.session.execute(
+            text("""
+            select distinct o2aa.asn
+              from fodyorg_x_organization fx
+              join fody.organisation_automatic oa
+                on oa.ripe_org_hdl = fx.ripe_org_hdl
+              join fody.organisation_to_asn_automatic o2aa
+                on o2aa.organisation_automatic_id = oa.organisation_automatic_id
+             where fx.organization_id = any(:b_org_ids)
+               and fx.deleted = 0
+          order by o2aa.asn
+            """
+            ), {'b_org_ids': list(org_ids)})
+        return tuple(str(row[0]) for row in results)
 
     def upsert_notification_setting(self,
                                asn = None,
@@ -956,37 +1283,114 @@ class FodyOrg_X_Organization(Model, SerializerMixin):
                                delivery_protocol = 'Mail',
                                delivery_format = 'CSV',
                                notification_interval = 604800):
-
-
-         self.fody_org = FodyOrganization(ripe_org_hdl = self.ripe_org_hdl)
-         if not (asn or cidr):
-             raise AttributeError('either cidr or asn has to be set')
-
-         if asn and asn not in self.fody_org.asns:
-             raise AttributeError('no such asn or not owned', asn, self.fody_org.asns)
-
-         if cidr and cidr not in self.fody_org.cidrs:
-             raise AttributeError('no such cidr or not owned', cidr)
-
-         try:
-             ns = NotificationSetting.query \
-                    .filter_by(asn=asn, cidr=cidr,
-                               organization_id=self.organization_id,
-                               ripe_org_hdl=self.ripe_org_hdl) \
-                    .one()
-         except NoResultFound:
-             ns = NotificationSetting()
-             ns.asn = asn
-             ns.cidr = cidr
-             ns.organization_id = self.organization_id
-             ns.ripe_org_hdl = self.ripe_org_hdl
-
-         ns.delivery_protocol = notification_setting['delivery_protocol'] if 'delivery_protocol' in notification_setting else delivery_protocol
-         ns.delivery_format = notification_setting['delivery_format'] if 'delivery_format'  in notification_setting else delivery_format
-         ns.notification_interval = notification_setting['notification_interval'] if 'notification_interval'  in notification_setting else notification_interval
-         db.session.add(ns)
-         self._notification_settings
-
+         self.upsert_notification_settings([{
+             'asn': asn,
+             'cidr': cidr,
+             'notification_setting': notification_setting,
+             'delivery_protocol': delivery_protocol,
+             'delivery_format': delivery_format,
+             'notification_interval': notification_interval,
+         }])
+
+    def upsert_notification_settings(self, settings):
+        """Insert or update the notification settings of many ASNs and CIDRs
+        with one statement
+
+        :param settings: List of dicts with the arguments of
+            :meth:`upsert_notification_setting`
+        :raises AttributeError: if an ASN or CIDR is not owned by the RIPE
+            handle or a value is invalid, nothing is written then
+        """
+        self.fody_org = FodyOrganization.get(self.ripe_org_hdl)
+        protocols = NotificationSetting.delivery_protocol.type.enums
+        formats = NotificationSetting.delivery_format.type.enums
+        rows = OrderedDict()
+        for setting in settings:
+            if not isinstance(setting, dict):
+                raise TypeError('setting must be a dict', setting)
+            unknown = set(setting) - {'asn', 'cidr', 'notification_setting',
+                                      'delivery_protocol', 'delivery_format',
+                                      'notification_interval'}
+            if unknown:
+                raise TypeError('unexpected keyword arguments',
+                                sorted(unknown))
+            asn = setting.get('asn')
+            cidr = setting.get('cidr')
+            if not (asn or cidr):
+                raise AttributeError('either cidr or asn has to be set')
+            if asn and asn not in self.fody_org.asns:
+                raise AttributeError('no such asn or not owned', asn, self.fody_org.asns)
+            if cidr and cidr not in self.fody_org.cidrs:
+                raise AttributeError('no such cidr or not owned', cidr)
+
+            values = {'delivery_protocol': 'Mail', 'delivery_format': 'CSV',
+                      'notification_interval': 604800}
+            for key in values:
+                if key in setting:
+                    values[key] = setting[key]
+            values.update(setting.get('notification_setting') or {})
+            if values['delivery_protocol'] not in protocols:
+                raise AttributeError('invalid delivery_protocol',
+                                     values['delivery_protocol'])
+            if values['delivery_format'] not in formats:
+                raise AttributeError('invalid delivery_format',
+                                     values['delivery_format'])
+            try:
+                values['notification_interval'] = \
+                    int(values['notification_interval'])
+            except (TypeError, ValueError):
+                raise AttributeError('invalid notification_interval',
+                                     values['notification_interval'])
+            # the last setting of the same asn and cidr wins
+            rows[(asn or None, cidr or None)] = values
+
+        if not rows:
+            return
+        db.session.flush()
+        db.session.execute(
+            text("""
+            insert into notification_settings
+                   (organization_id, ripe_org_hdl, asn, cidr,
+                    delivery_protocol, delivery_format, notification_interval,
+                    deleted)
+            select :b_organization_id, :b_ripe_org_hdl, s.asn, s.cidr,
+                   s.delivery_protocol, s.delivery_format,
+                   s.notification_interval, 0
+              from unnest(cast(:b_asns as varchar[]),
+                          cast(:b_cidrs as cidr[]),
+                          cast(:b_protocols as delivery_protocol_enum[]),
+                          cast(:b_formats as delivery_format_enum[]),
+                          cast(:b_intervals as integer[]))
+                   as s(asn, cidr, delivery_protocol, delivery_format,
+                        notification_interval)
+                on conflict (organization_id, ripe_org_hdl,
+                             coalesce(asn, ''),
+                             coalesce(cidr, cast('0.0.0.0/0' as cidr)))
+             where deleted = 0
+         do update set delivery_protocol = excluded.delivery_protocol,
+                       delivery_format = excluded.delivery_format,
+                       notification_interval = excluded.notification_interval
+            """), {
+                'b_organization_id': self.organization_id,
+                'b_ripe_org_hdl': self.ripe_org_hdl,
+                'b_asns': [asn for asn, _ in rows],
+                'b_cidrs': [cidr for _, cidr in rows],
+                'b_protocols': [v['delivery_protocol'] for v in rows.values()],
+                'b_formats': [v['delivery_format'] for v in rows.values()],
+                'b_intervals': [v['notification_interval']
+                                for v in rows.values()],
+            })
+        # written past the ORM, so no mapper event marks it
+        generations.mark(db.session, 'notification_settings')
+        db.session.expire_all()
+
+
+
+@event.listens_for(FodyOrg_X_Organization, 'after_insert')
+@event.listens_for(FodyOrg_X_Organization, 'after_update')
+@event.listens_for(FodyOrg_X_Organization, 'after_delete')
+def _fody_link_invalidate(mapper, connection, target):
+    generations.mark(target, 'fody_links')
 
 
 class NotificationSetting(Model, SerializerMixin):
@@ -1002,60 +1406,163 @@ class NotificationSetting(Model, SerializerMixin):
     delivery_format = db.Column(db.Enum('CSV', 'JSON', name='delivery_format_enum'), default='CSV')
     notification_interval = db.Column(db.Integer, default=0)
     ripe_org_hdl = db.Column('ripe_org_hdl', db.String(255))
-    asn = db.Column('asn', db.String(255), unique=True)
+    asn = db.Column('asn', db.String(255))
     cidr = db.Column(postgres.CIDR)
     deleted = db.Column(db.Integer, default=0)
 
     organization = db.relationship('Organization')
 
+    __table_args__ = (
+        # one active setting per resource, the conflict target of
+        # FodyOrg_X_Organization.upsert_notification_settings
+        db.Index('ix_notification_settings_resource',
+                 organization_id, ripe_org_hdl,
+                 db.func.coalesce(asn, db.literal_column("''")),
+                 db.func.coalesce(
+                     cidr, db.literal_column("cast('0.0.0.0/0' as cidr)")),
+                 unique=True, postgresql_where=deleted == 0),
+    )
+
     # ripe_org_hdl = db.Column(db.Integer,
     #               db.ForeignKey('fody.organisation_automatic.ripe_org_hdl'))
 
 
     @staticmethod
     def contact_for_netblock(cidr):
-        abusecs = []
+        ripe_org_hdl, abusecs = FodyOrganization.contacts_for_cidr(cidr)
+        return NotificationSetting._contact(ripe_org_hdl, lambda: abusecs,
+                                            cidr=cidr)
+
+    @staticmethod
+    def contact_for_asn(asn):
+        """Like :meth:`contact_for_netblock` for an AS number
+
+        :param asn: ``29429`` or ``'AS29429'``
+        :raises AttributeError: if no RIPE organization holds ``asn``
+        """
+        try:
+            asn = int(str(asn).strip().upper().replace('AS', ''))
+        except ValueError:
+            raise AttributeError('no such asn', asn)
+        found = FodyOrganization.asn_index().get(asn)
+        if found is None:
+            raise AttributeError('no such asn', asn)
+        ripe_org_hdl, abusecs = found
+        return NotificationSetting._contact(ripe_org_hdl, lambda: abusecs,
+                                            asn=str(asn))
+
+    @staticmethod
+    def _contact(ripe_org_hdl, ripe_abusecs, **resource):
+        """Notification setting and abuse contacts of ``resource``
+        (``cidr=`` or ``asn=``) held by ``ripe_org_hdl``. Local ``abuse-c``
+        memberships win over the RIPE contacts returned by
+        ``ripe_abusecs()``.
+        """
         default_notification_setting = {
             'delivery_protocol': 'Mail',
             'delivery_format': 'CSV',
             'notification_interval': 604800,
-            'cidr': cidr,
             'organization_id': None,
             'ripe_org_hdl': None,
         }
-
-        ripe_org_hdl = FodyOrganization.handle_for_cidr(cidr)
-        # check if the ripe handle is associated with an org and excactly this cidr
-        ns = NotificationSetting.query. \
-             filter_by(ripe_org_hdl=ripe_org_hdl, cidr=cidr).first()
-
-        # no explicit settings for cidr, check if cidr is associated with an organization via ripe handle
-        if ns:
-            nss = ns.serialize()
+        default_notification_setting.update(resource)
+
+        index = NotificationSetting.contact_index()
+        (kind, value), = resource.items()
+        if kind == 'cidr':
+            try:
+                value = str(ipaddress.ip_network(value.strip()))
+            except ValueError:
+                pass
+
+        # check if the ripe handle is associated with an org and excactly this resource
+        found = index.settings.get((ripe_org_hdl, kind, value))
+
+        # no explicit settings for resource, check if it is associated with an organization via ripe handle
+        if found:
+            organization_id, nss = found
+            nss = dict(nss)
         else:
             nss = default_notification_setting
-            ns = NotificationSetting.query. \
-                filter_by(ripe_org_hdl=ripe_org_hdl).first()
-            if ns:
-                nss['organization_id'] = ns.organization_id
-                nss['ripe_org_hdl'] = ns.ripe_org_hdl
+            organization_id = index.handles.get(ripe_org_hdl, _MISSING)
+            if organization_id is not _MISSING:
+                nss['organization_id'] = organization_id
+                nss['ripe_org_hdl'] = ripe_org_hdl
 
         org_abusecs = []
-        if ns:
-        # we have a cidr with settings get the local abusecs (if defined)
-            org_abusecs = ns.organization.organization_memberships. \
-                      filter_by(membership_role = MembershipRole.query.filter_by(name='abuse-c').\
-                      one()).all()
+        if found or organization_id is not _MISSING:
+        # we have a resource with settings get the local abusecs (if defined)
+            org_abusecs = index.abusecs.get(organization_id, [])
 
-        # if cidr is not found in database AttributeError: ('no such cidr', ..) is raised and not caught here
         if org_abusecs:
-            abusecs = [o.email for o in org_abusecs]
+            abusecs = list(org_abusecs)
         else:
-            fody_org = FodyOrganization(ripe_org_hdl = ripe_org_hdl)
-            abusecs = fody_org.abusecs
+            abusecs = list(ripe_abusecs())
 
         return {'abusecs': abusecs, 'notification_setting': nss }
 
+    #: ``(generation, ContactIndex)`` built by :meth:`contact_index`
+    _contact_index = None
+
+    @classmethod
+    def contact_index(cls):
+        """:class:`ContactIndex` of all notification settings and local
+        ``abuse-c`` contacts, rebuilt when the ``notification_settings``
+        generation changes.
+        """
+        generation = generations.get(
+            'notification_settings',
+            max_age=_config.CONTACT_GENERATION_MAX_AGE)
+        cached = cls._contact_index
+        if cached is None or cached[0] != generation:
+            cached = (generation, cls._build_contact_index())
+            cls._contact_index = cached
+        return cached[1]
+
+    @classmethod
+    def _build_contact_index(cls):
+        settings = {}
+        handles = {}
+        for ns in cls.query.order_by(cls.id):
+            nss = ns.serialize()
+            if ns.cidr:
+                settings.setdefault((ns.ripe_org_hdl, 'cidr', str(ns.cidr)),
+                                    (ns.organization_id, nss))
+            if ns.asn:
+                settings.setdefault((ns.ripe_org_hdl, 'asn', ns.asn),
+                                    (ns.organization_id, nss))
+            handles.setdefault(ns.ripe_org_hdl, ns.organization_id)
+        abusecs = {}
+        rows = db.session.query(OrganizationMembership.organization_id,
+                                OrganizationMembership._email). \
+            join(MembershipRole). \
+            filter(MembershipRole.name == 'abuse-c',
+                   OrganizationMembership.deleted == 0). \
+            order_by(OrganizationMembership.id)
+        for organization_id, email in rows:
+            abusecs.setdefault(organization_id, []).append(email)
+        return ContactIndex(settings, handles, abusecs)
+
+
+class ContactIndex(namedtuple('ContactIndex',
+                              ['settings', 'handles', 'abusecs'])):
+    """Lookup tables of :meth:`NotificationSetting.contact_index`
+
+    ``settings`` maps ``(ripe_org_hdl, 'cidr' or 'asn', value)`` to
+    ``(organization_id, serialized setting)``, ``handles`` maps a RIPE org
+    handle to the organization of its first setting and ``abusecs`` an
+    organization id to the emails of its ``abuse-c`` memberships.
+    """
+    __slots__ = ()
+
+
+@event.listens_for(NotificationSetting, 'after_insert')
+@event.listens_for(NotificationSetting, 'after_update')
+@event.listens_for(NotificationSetting, 'after_delete')
+def _notification_setting_contact_invalidate(mapper, connection, target):
+    generations.mark(target, 'notification_settings')
+
+
 class FodyOrganization():
     # __tablename__ = 'fody.organisation_automatic'
     __public__ = ('ripe_org_hdl',
@@ -1066,105 +1573,282 @@ class FodyOrganization():
                   'abusecs'
                   )
 
-    cidrs   = None
-    asns    = None
-    abusecs = None
+    @staticmethod
+    def refresh_abuse_contacts():
+        """Refresh the ``fody_abuse_contacts`` materialized view after a
+        RIPE import, readers are not blocked. Creates the view if it is
+        missing.
+        """
+        exists = db.session.execute(
+            text("select to_regclass('fody_abuse_contacts')")).scalar()
+        if exists is None:
+            db.session.execute(text(FODY_ABUSE_CONTACTS_DDL))
+        else:
+            db.session.execute(
+                text('refresh materialized view concurrently '
+                     'fody_abuse_contacts'))
+
+    #: ``(generation, dict)`` built by :meth:`asn_index`
+    _asn_index = None
+
+    @classmethod
+    def asn_index(cls):
+        """Dict of all RIPE AS numbers to ``(ripe_org_hdl, abusecs)``, read
+        from the ``fody_abuse_contacts`` view. Rebuilt when the ``fody``
+        generation is bumped (``manage.py refresh_fody_contacts``).
+        """
+        generation = generations.get(
+            'fody', max_age=_config.CONTACT_GENERATION_MAX_AGE)
+        cached = cls._asn_index
+        if cached is None or cached[0] != generation:
+            index = {}
+            results = db.engine.execute(
+                text("""
+                select asn, ripe_org_hdl, abusecs
+                       from fody_abuse_contacts
+                      where asn is not null
+                   order by organisation_automatic_id
+                """
+                ))
+            for asn, ripe_org_hdl, abusecs in results:
+                index.setdefault(asn, (ripe_org_hdl, tuple(abusecs)))
+            cached = (generation, index)
+            cls._asn_index = cached
+        return cached[1]
+
+    #: ``(generation, IntervalIndex)`` built by :meth:`network_index`
+    _network_index = None
+
+    @classmethod
+    def network_index(cls):
+        """:class:`~app.utils.ipindex.IntervalIndex` of all RIPE networks,
+        values are ``(ripe_org_hdl, abusecs)``, read from the
+        ``fody_abuse_contacts`` view.
+
+        Built on first use and rebuilt when the ``fody`` generation is
+        bumped (``manage.py refresh_fody_contacts`` after a RIPE import).
+        """
+        generation = generations.get(
+            'fody', max_age=_config.CONTACT_GENERATION_MAX_AGE)
+        cached = cls._network_index
+        if cached is None or cached[0] != generation:
+            results = db.engine.execute(
+                text("""
+                select network, ripe_org_hdl, abusecs
+                       from fody_abuse_contacts
+                      where network is not null
+                   order by organisation_automatic_id
+                """
+                ))
+            cached = (generation, IntervalIndex(
+                (str(network), (ripe_org_hdl, tuple(abusecs)))
+                for network, ripe_org_hdl, abusecs in results))
+            cls._network_index = cached
+        return cached[1]
 
     @staticmethod
-    def handle_for_cidr(cidr):
-        results = db.engine.execute(
+    def contacts_for_cidr(cidr):
+        """``(ripe_org_hdl, abusecs)`` of the most specific network
+        containing ``cidr``
+
+        :raises ValueError: if ``cidr`` is not an IP address or CIDR
+        :raises AttributeError: if no network contains ``cidr``
+        """
+        found = FodyOrganization.network_index().lookup(cidr)
+        if found is None:
+            raise AttributeError('no such cidr', cidr)
+        return found
+
+    def __init__(self, ripe_org_hdl):
+        fody_org = FodyOrganization.get(ripe_org_hdl)
+        # copy, the loaded object is shared through the cache
+        for key, value in fody_org.__dict__.items():
+            setattr(self, key, list(value) if isinstance(value, list)
+                    else value)
+
+    @classmethod
+    def get(cls, ripe_org_hdl):
+        """Single handle variant of :meth:`load_many`
+
+        :raises AttributeError: if there is no such handle
+        """
+        fody_org = cls.load_many([ripe_org_hdl]).get(ripe_org_hdl)
+        if fody_org is None:
+            raise AttributeError('no such handle', ripe_org_hdl)
+        return fody_org
+
+    #: process wide cache of loaded handles, keyed by handle and ``fody``
+    #: generation. Cached objects are shared, don't modify them.
+    cache = LRUCache(maxsize=_config.FODY_CACHE_SIZE,
+                     ttl=_config.FODY_CACHE_TTL)
+
+    @staticmethod
+    def existing(ripe_org_hdls):
+        """Set of the ``ripe_org_hdls`` known to fody, in one query"""
+        results = db.session.execute(
             text("""
             select ripe_org_hdl
-                   from fody.organisation_automatic oa
-                   join fody.organisation_to_network_automatic o2na
-                     on oa.organisation_automatic_id =
-                        o2na.organisation_automatic_id
-                   join fody.network_automatic na
-                     on o2na.network_automatic_id = na.network_automatic_id
-                      where address >>= :b_address
+              from fody.organisation_automatic
+             where ripe_org_hdl = any(:b_ripe_org_hdls)
             """
-            ), {'b_address': cidr})
+            ), {'b_ripe_org_hdls': list(ripe_org_hdls)})
+        return {row[0] for row in results}
 
-        for row in results:
-            return row[0]
-        raise AttributeError('no such cidr', cidr)
+    @classmethod
+    def load_many(cls, ripe_org_hdls):
+        """Organizations, networks, ASNs and abuse contacts of all
+        ``ripe_org_hdls``. Handles missing in :attr:`cache` are loaded in
+        four queries.
 
-    def __init__(self, ripe_org_hdl):
+        :return: dict of ``ripe_org_hdl: FodyOrganization``, unknown
+            handles are left out
+        """
+        ripe_org_hdls = set(ripe_org_hdls)
+        if not ripe_org_hdls:
+            return {}
+
+        generation = generations.get('fody')
+        fody_orgs = {}
+        missing = []
+        for ripe_org_hdl in ripe_org_hdls:
+            fody_org = cls.cache.get((ripe_org_hdl, generation), _MISSING)
+            if fody_org is _MISSING:
+                missing.append(ripe_org_hdl)
+            elif fody_org is not None:
+                fody_orgs[ripe_org_hdl] = fody_org
+
+        if missing:
+            loaded = cls._load_many(missing)
+            for ripe_org_hdl in missing:
+                # unknown handles are cached as well
+                cls.cache.set((ripe_org_hdl, generation),
+                              loaded.get(ripe_org_hdl))
+            fody_orgs.update(loaded)
+        return fody_orgs
+
+    @classmethod
+    def _load_many(cls, ripe_org_hdls):
         results = db.engine.execute(
             text("""
             select ripe_org_hdl,
                    name,
                    organisation_automatic_id
               from fody.organisation_automatic
-             where ripe_org_hdl = :b_ripe_org_hdl
+             where ripe_org_hdl = any(:b_ripe_org_hdls)
             """
-            ), {'b_ripe_org_hdl': ripe_org_hdl})
+            ), {'b_ripe_org_hdls': ripe_org_hdls})
 
+        by_id = {}
         for row in results:
-            self.ripe_org_hdl = row[0]
-            self.name = row[1]
-            self.organisation_automatic_id = row[2]
-            c = self._cidrs
-            a = self._asns
-            ac = self._abusecs
-            return None
+            fody_org = cls.__new__(cls)
+            fody_org.ripe_org_hdl = row[0]
+            fody_org.name = row[1]
+            fody_org.organisation_automatic_id = row[2]
+            fody_org.cidrs = []
+            fody_org.asns = []
+            fody_org.abusecs = []
+            by_id[row[2]] = fody_org
+        if not by_id:
+            return {}
+        ids = list(by_id)
 
-        raise AttributeError('no such handle', ripe_org_hdl)
-
-    @property
-    def _cidrs(self):
-        if self.cidrs:
-            return self.cidrs
         results = db.engine.execute(
             text("""
-            select address
-                   from fody.organisation_automatic oa
-                   join fody.organisation_to_network_automatic o2na
-                     on oa.organisation_automatic_id =
-                        o2na.organisation_automatic_id
+            select o2na.organisation_automatic_id, na.address
+                   from fody.organisation_to_network_automatic o2na
                    join fody.network_automatic na
                      on o2na.network_automatic_id = na.network_automatic_id
-                      where ripe_org_hdl = :b_ripe_org_hdl
+                  where o2na.organisation_automatic_id = any(:b_ids)
+                  order by na.address
             """
-            ), {'b_ripe_org_hdl': self.ripe_org_hdl})
-
-        self.cidrs = [row[0] for row in results]
-        return self.cidrs;
+            ), {'b_ids': ids})
+        for org_id, address in results:
+            by_id[org_id].cidrs.append(address)
 
-    @property
-    def _asns(self):
-        if self.asns:
-            return self.asns
         results = db.engine.execute(
             text("""
-            select asn
-                   from fody.organisation_automatic oa
-                   join fody.organisation_to_asn_automatic o2aa
-                     on oa.organisation_automatic_id =
-                        o2aa.organisation_automatic_id
-                      where ripe_org_hdl = :b_ripe_org_hdl
+            select organisation_automatic_id, asn
+                   from fody.organisation_to_asn_automatic
+                  where organisation_automatic_id = any(:b_ids)
+                  order by asn
             """
-            ), {'b_ripe_org_hdl': self.ripe_org_hdl})
-
-        self.asns = [str(row[0]) for row in results]
-        return self.asns;
+            ), {'b_ids': ids})
+        for org_id, asn in results:
+            by_id[org_id].asns.append(str(asn))
 
-    @property
-    def _abusecs(self):
-        if self.abusecs:
-            return self.abusecs
         results = db.engine.execute(
             text("""
-            select email
-                   from fody.organisation_automatic oa
-                   join fody.contact_automatic ca
-                     on oa.organisation_automatic_id =
-                        ca.organisation_automatic_id
-                      where ripe_org_hdl = :b_ripe_org_hdl
+            select organisation_automatic_id, email
+                   from fody.contact_automatic
+                  where organisation_automatic_id = any(:b_ids)
+                  order by email
             """
-            ), {'b_ripe_org_hdl': self.ripe_org_hdl})
-
-        self.abusecs = [str(row[0]) for row in results]
+            ), {'b_ids': ids})
+        for org_id, email in results:
+            by_id[org_id].abusecs.append(str(email))
+
+        return {o.ripe_org_hdl: o for o in by_id.values()}
+
+
+#: ASNs and networks of all RIPE (fody) organizations with their handle
+#: and abuse contacts. ``key`` is unique so the view can be refreshed
+#: concurrently, see :meth:`FodyOrganization.refresh_abuse_contacts`.
+FODY_ABUSE_CONTACTS_DDL = """
+create materialized view fody_abuse_contacts as
+select 'asn ' || o2aa.asn || ' ' || oa.organisation_automatic_id as key,
+       oa.organisation_automatic_id,
+       oa.ripe_org_hdl,
+       o2aa.asn,
+       null::cidr as network,
+       array(select ca.email::text
+               from fody.contact_automatic ca
+              where ca.organisation_automatic_id =
+                    oa.organisation_automatic_id
+              order by ca.email) as abusecs
+  from fody.organisation_automatic oa
+  join fody.organisation_to_asn_automatic o2aa
+    on oa.organisation_automatic_id = o2aa.organisation_automatic_id
+union all
+select 'net ' || na.address || ' ' || oa.organisation_automatic_id,
+       oa.organisation_automatic_id,
+       oa.ripe_org_hdl,
+       null,
+       na.address,
+       array(select ca.email::text
+               from fody.contact_automatic ca
+              where ca.organisation_automatic_id =
+                    oa.organisation_automatic_id
+              order by ca.email)
+  from fody.organisation_automatic oa
+  join fody.organisation_to_network_automatic o2na
+    on oa.organisation_automatic_id = o2na.organisation_automatic_id
+  join fody.network_automatic na
+    on o2na.network_automatic_id = na.network_automatic_id;
+create unique index ix_fody_abuse_contacts_key on fody_abuse_contacts (key);
+create index ix_fody_abuse_contacts_asn on fody_abuse_contacts (asn);
+create index ix_fody_abuse_contacts_network on fody_abuse_contacts
+    using gist (network inet_ops);
+"""
+
+
+def _fody_schema_exists(ddl, target, bind, **kw):
+    return bind.execute(
+        text("""select exists (
+                select 1 from information_schema.tables
+                 where table_schema = 'fody'
+                   and table_name = 'organisation_automatic')
+        """)).scalar()
+
+
+# organizations.path; a no-op if the extension exists, else it needs a
+# superuser (see docs/01_INSTALL.md)
+event.listen(db.metadata, 'before_create',
+             DDL('create extension if not exists ltree'))
+event.listen(db.metadata, 'after_create',
+             DDL(FODY_ABUSE_CONTACTS_DDL).execute_if(
+                 callable_=_fody_schema_exists))
+event.listen(db.metadata, 'before_drop',
+             DDL('drop materialized view if exists fody_abuse_contacts'))
 
 
 class ContactEmail(Model, SerializerMixin):
@@ -1194,7 +1878,6 @@ class ContactEmail(Model, SerializerMixin):
         'Organization',
         backref=db.backref(
             'contact_emails',
-            lazy='joined',
             cascade='all, delete-orphan'
         )
     )
@@ -1290,6 +1973,33 @@ class Organization(Model, SerializerMixin):
                   'contact_emails', 'display_name', 'parent_org_id',
                   'parent_org_abbreviation', 'ripe_handles')
                   # 'notification_settings')
+    #: relationships are loaded lazily, endpoints pick what they need
+    __loader_profiles__ = {
+        # parents, ripe links and groups come from :meth:`preload`
+        'list': (
+            subqueryload('ip_ranges_'),
+            subqueryload('abuse_emails_'),
+            subqueryload('asns_'),
+            subqueryload('fqdns_'),
+            subqueryload('contact_emails').joinedload('email_'),
+        ),
+        'detail': (
+            joinedload('group'),
+            subqueryload('contact_emails').joinedload('email_'),
+        ),
+        # may_handle_organization only needs the id
+        'auth-check': (
+            load_only('id', 'parent_org_id'),
+        ),
+    }
+    __field_attrs__ = {
+        'abuse_emails': ('abuse_emails_',),
+        'ip_ranges': ('ip_ranges_',),
+        'fqdns': ('fqdns_',),
+        'asns': ('asns_',),
+        'parent_org_abbreviation': ('parent_org_id', 'parent_org'),
+        'ripe_handles': ('ripe_organizations',),
+    }
 
     query_class = FilteredQuery
     id = db.Column(db.Integer, primary_key=True)
@@ -1311,25 +2021,120 @@ class Organization(Model, SerializerMixin):
     mail_times = db.Column(db.Integer, default=3600)
     ts_deleted = db.Column(db.DateTime)
     deleted = db.Column(db.Integer, default=0)
+    #: ids from the root down to this organization, e.g. ``1.7.42``.
+    #: Maintained by the mapper events below, never set it directly.
+    path = deferred(db.Column(Ltree))
+    __table_args__ = (
+        db.Index('ix_organizations_path', 'path', postgresql_using='gist'),
+    )
     # def __init__(self):
     #     self.__parent_org_abbreviation = None
 
-    # too slow ...
-    _org_cache = {}
-
-    @hybrid_property
+    @property
     def parent_org_abbreviation(self):
-        if self.parent_org_id:
-            if self.parent_org_id in self._org_cache:
-                return self._org_cache[self.parent_org_id]['abbreviation']
-            else:
-                abbr = Organization.query.get(self.parent_org_id).abbreviation
-                if not self.parent_org_id in self._org_cache:
-                    self._org_cache[self.parent_org_id] = {}
-                self._org_cache[self.parent_org_id]['abbreviation'] = abbr
-                return abbr
-        else:
+        if not self.parent_org_id:
             return None
+        # many-to-one, answered from the identity map once preloaded
+        parent_org = self.parent_org
+        if parent_org is None or parent_org.id != self.parent_org_id:
+            # not flushed yet or moved since the parent was loaded
+            parent_org = db.session.query(Organization).get(
+                self.parent_org_id)
+        return parent_org.abbreviation if parent_org else None
+
+    @staticmethod
+    def preload(orgs, collections=False):
+        """Load parent organizations, ripe links and groups of all ``orgs``
+        with one query per relation, so serializing them does not query
+        per row. Relations already loaded are left alone.
+
+        :param orgs: Organizations, e.g. a page of a list endpoint
+        :param collections: Also load ip ranges, ASNs, FQDNs and e-mails,
+            for queries that cannot eager load them, e.g. with ``yield_per``
+        :return: ``orgs`` as a list
+        """
+        orgs = list(orgs)
+        if collections:
+            Organization._preload_collections(orgs)
+
+        todo = [o for o in orgs if 'parent_org' not in o.__dict__]
+        parent_ids = {o.parent_org_id for o in todo if o.parent_org_id}
+        parents = {}
+        if parent_ids:
+            # deleted parents too, like the relationship
+            parents = {p.id: p for p in db.session.query(Organization).
+                       filter(Organization.id.in_(parent_ids))}
+        for o in todo:
+            set_committed_value(o, 'parent_org',
+                                parents.get(o.parent_org_id))
+
+        todo = [o for o in orgs if 'ripe_organizations' not in o.__dict__]
+        links = {o.id: [] for o in todo if o.id is not None}
+        if links:
+            for link in db.session.query(FodyOrg_X_Organization). \
+                    filter(FodyOrg_X_Organization.organization_id.in_(
+                        list(links))). \
+                    order_by(FodyOrg_X_Organization.id):
+                links[link.organization_id].append(link)
+        for o in todo:
+            if o.id is not None:
+                set_committed_value(o, 'ripe_organizations', links[o.id])
+
+        todo = [o for o in orgs if 'group' not in o.__dict__]
+        group_ids = {o.group_id for o in todo if o.group_id}
+        groups = {}
+        if group_ids:
+            groups = {gr.id: gr for gr in OrganizationGroup.query.filter(
+                OrganizationGroup.id.in_(group_ids))}
+        for o in todo:
+            set_committed_value(o, 'group', groups.get(o.group_id))
+        return orgs
+
+    @staticmethod
+    def _preload_collections(orgs):
+        for attr, model, criteria in (
+                ('ip_ranges_', IpRange, (IpRange.deleted == 0,)),
+                ('asns_', Asn, (Asn.deleted == 0,)),
+                ('fqdns_', Fqdn, ()),
+                ('contact_emails', ContactEmail, ())):
+            todo = {o.id: o for o in orgs
+                    if o.id is not None and attr not in o.__dict__}
+            if not todo:
+                continue
+            items = {org_id: [] for org_id in todo}
+            for item in db.session.query(model). \
+                    filter(model.organization_id.in_(list(todo)),
+                           *criteria). \
+                    order_by(model.id):
+                items[item.organization_id].append(item)
+            for org_id, o in todo.items():
+                set_committed_value(o, attr, items[org_id])
+
+        todo = {o.id: o for o in orgs
+                if o.id is not None and 'abuse_emails_' not in o.__dict__}
+        if todo:
+            items = {org_id: [] for org_id in todo}
+            rows = db.session.query(emails_organizations.c.organization_id,
+                                    Email). \
+                join(Email, Email.id == emails_organizations.c.email_id). \
+                filter(emails_organizations.c.organization_id.in_(list(todo)),
+                       Email.deleted == 0). \
+                order_by(emails_organizations.c.id)
+            for org_id, email in rows:
+                items[org_id].append(email)
+            for org_id, o in todo.items():
+                set_committed_value(o, 'abuse_emails_', items[org_id])
+
+        # the addresses of the contact e-mails
+        contact_emails = [ce for o in orgs
+                          for ce in o.__dict__.get('contact_emails', ())
+                          if 'email_' not in ce.__dict__]
+        email_ids = {ce.email_id for ce in contact_emails if ce.email_id}
+        if email_ids:
+            emails = {e.id: e for e in db.session.query(Email).
+                      filter(Email.id.in_(email_ids))}
+            for ce in contact_emails:
+                set_committed_value(ce, 'email_', emails.get(ce.email_id))
 
     '''
     @hybrid_property
@@ -1346,10 +2151,6 @@ class Organization(Model, SerializerMixin):
         return [ro.ripe_org_hdl for ro in self.ripe_organizations]
 
 
-    @property
-    def notification_settings(self):
-        return [ro.notification_settings for ro in self.ripe_organizations]
-
     parent_org_id = db.Column(db.Integer, db.ForeignKey('organizations.id'))
     child_organizations = db.relationship(
         'Organization',
@@ -1361,8 +2162,6 @@ class Organization(Model, SerializerMixin):
     parent_org = db.relationship('Organization', remote_side=[id])
     child_orgs = db.relationship('Organization',
             # backref=db.backref('parent', remote_side=[id])
-            lazy="joined",
-            join_depth=5
             )
 
     organization_memberships = db.relationship(
@@ -1378,7 +2177,6 @@ class Organization(Model, SerializerMixin):
     )
     ip_ranges_ = db.relationship(
         'IpRange',
-        lazy='joined',
         cascade='all, delete-orphan',
         primaryjoin="and_(IpRange.organization_id == Organization.id, "
                     "IpRange.deleted == 0)",
@@ -1390,7 +2188,6 @@ class Organization(Model, SerializerMixin):
     )
     abuse_emails_ = db.relationship(
         "Email", secondary=lambda: emails_organizations,
-        lazy='joined',
         secondaryjoin=db.and_(
             Email.id == emails_organizations.c.email_id,
             Email.deleted == 0)
@@ -1407,7 +2204,6 @@ class Organization(Model, SerializerMixin):
 
     asns_ = db.relationship(
         'Asn',
-        lazy='joined',
         cascade='all, delete-orphan',
         primaryjoin="and_(Asn.organization_id == Organization.id,"
                     "Asn.deleted == 0)"
@@ -1418,7 +2214,6 @@ class Organization(Model, SerializerMixin):
         creator=lambda asn: Asn(asn=asn)
     )
     fqdns_ = db.relationship('Fqdn',
-        lazy='joined',
         cascade='all, delete-orphan')
 
     fqdns = association_proxy(
@@ -1446,24 +2241,40 @@ class Organization(Model, SerializerMixin):
 
     @ripe_handles.setter
     def ripe_handles(self, ripe_handles):
-        current_ripe_handles = [ro.ripe_org_hdl for ro in self.ripe_organizations]
-        for ripe_handle in ripe_handles:
-            if ripe_handle in current_ripe_handles:
-                current_ripe_handles.remove(ripe_handle)
-            else:
-                forg_x_org = FodyOrg_X_Organization();
-                forg_x_org.ripe_org_hdl = ripe_handle
-                self.ripe_organizations.append(forg_x_org)
-
-        for ripe_handle in current_ripe_handles:
-            forg_x_org = FodyOrg_X_Organization.query   \
-                .filter_by(_ripe_org_hdl = ripe_handle) \
-                .filter_by(organization_id = self.id).one()
-            # forg_x_org.delete();
-            self.ripe_organizations.remove(forg_x_org)
-            db.session.delete(forg_x_org)
-
-
+        ripe_handles = list(OrderedDict.fromkeys(ripe_handles))
+        current = OrderedDict((ro.ripe_org_hdl, ro)
+                              for ro in self.ripe_organizations)
+        added = [h for h in ripe_handles if h not in current]
+        if added:
+            existing = FodyOrganization.existing(added)
+            for ripe_handle in added:
+                if ripe_handle not in existing:
+                    raise AttributeError('no such handle', ripe_handle)
+
+        stale = [ro for h, ro in current.items() if h not in ripe_handles]
+        if stale:
+            stale_ids = [ro.id for ro in stale if ro.id is not None]
+            if stale_ids:
+                db.session.query(FodyOrg_X_Organization). \
+                    filter(FodyOrg_X_Organization.id.in_(stale_ids)). \
+                    delete(synchronize_session=False)
+                generations.mark(db.session, 'fody_links')
+            for ro in stale:
+                if ro in db.session:
+                    db.session.expunge(ro)
+            kept = [ro for h, ro in current.items() if h in ripe_handles]
+            set_committed_value(self, 'ripe_organizations',
+                                [ro for ro in kept if ro.id is not None])
+            # links not flushed yet are appended again to get inserted
+            for ro in kept:
+                if ro.id is None:
+                    self.ripe_organizations.append(ro)
+
+        for ripe_handle in added:
+            forg_x_org = FodyOrg_X_Organization()
+            # validated above, skip the fody load of the ripe_org_hdl setter
+            forg_x_org._ripe_org_hdl = ripe_handle
+            self.ripe_organizations.append(forg_x_org)
 
     @staticmethod
     def from_collab(customer):
@@ -1535,6 +2346,178 @@ class Organization(Model, SerializerMixin):
     def __repr__(self):
         return '{} #{}'.format(self.__class__.__name__, self.abbreviation)
 
+    @staticmethod
+    def abuse_contacts(org_ids):
+        """Abbreviation and abuse e-mails of many organizations at once
+
+        :param org_ids: Organization IDs
+        :return: dict of ``id: {'abbreviation': ..., 'abuse_emails': [...]}``
+        """
+        if not org_ids:
+            return {}
+        rows = db.session.query(Organization.id, Organization.abbreviation,
+                                Email.email). \
+            outerjoin(emails_organizations,
+                      emails_organizations.c.organization_id ==
+                      Organization.id). \
+            outerjoin(Email, db.and_(Email.id == emails_organizations.c.email_id,
+                                     Email.deleted == 0)). \
+            filter(Organization.id.in_(org_ids))
+        contacts = {}
+        for org_id, abbreviation, email in rows:
+            contact = contacts.setdefault(
+                org_id, {'abbreviation': abbreviation, 'abuse_emails': []})
+            if email:
+                contact['abuse_emails'].append(email)
+        return contacts
+
+    @staticmethod
+    def rebuild_paths(connection = None):
+        """Rebuild ``organizations.path`` from ``parent_org_id``"""
+        connection = connection or db.session.connection()
+        connection.execute(
+            text("""with recursive tree (id, path) as (
+                         select id, text2ltree(cast(id as text))
+                           from organizations
+                          where parent_org_id is null
+                         union all
+                         select o.id, t.path || cast(o.id as text)
+                           from organizations o
+                           join tree t on t.id = o.parent_org_id)
+                    update organizations o set path = tree.path
+                      from tree
+                     where tree.id = o.id
+            """))
+
+    @staticmethod
+    def rebuild_closure(connection = None):
+        """Rebuild ``organization_closure`` from ``parent_org_id``.
+        The mapper events keep the table up to date, this is only needed
+        for rows written behind the ORM's back (bulk imports, raw SQL).
+        """
+        connection = connection or db.session.connection()
+        connection.execute(organization_closure.delete())
+        connection.execute(
+            text("""insert into organization_closure
+                           (ancestor_id, descendant_id, depth)
+                    with recursive tree (ancestor_id, descendant_id, depth) as (
+                         select id, id, 0 from organizations
+                         union all
+                         select t.ancestor_id, o.id, t.depth + 1
+                           from organizations o
+                           join tree t on t.descendant_id = o.parent_org_id)
+                    select ancestor_id, descendant_id, min(depth)
+                      from tree
+                  group by ancestor_id, descendant_id
+            """))
+
+
+@event.listens_for(Organization, 'after_insert')
+def _organization_closure_insert(mapper, connection, target):
+    connection.execute(
+        text("""insert into organization_closure
+                       (ancestor_id, descendant_id, depth)
+                select :b_id, :b_id, 0
+                union all
+                select ancestor_id, :b_id, depth + 1
+                  from organization_closure
+                 where descendant_id = :b_parent_org_id
+        """), {'b_id': target.id, 'b_parent_org_id': target.parent_org_id})
+
+
+@event.listens_for(Organization, 'after_update')
+def _organization_closure_move(mapper, connection, target):
+    """Re-attach the subtree of ``target`` when ``parent_org_id`` changed.
+    Soft deleted organizations keep their rows, ``deleted`` is filtered when
+    reading so the subtree below stays reachable (like the former recursive
+    queries did).
+    """
+    if not get_history(target, 'parent_org_id').has_changes():
+        return
+
+    if target.parent_org_id is not None:
+        cycle = connection.execute(
+            text("""select 1 from organization_closure
+                     where ancestor_id = :b_id
+                       and descendant_id = :b_parent_org_id
+            """), {'b_id': target.id,
+                   'b_parent_org_id': target.parent_org_id}).first()
+        if cycle:
+            raise AttributeError(
+                'Organisation cannot be moved below one of its child organisations')
+
+    # detach the subtree from all its former ancestors ...
+    connection.execute(
+        text("""delete from organization_closure
+                 where descendant_id in (select descendant_id
+                                           from organization_closure
+                                          where ancestor_id = :b_id)
+                   and ancestor_id not in (select descendant_id
+                                             from organization_closure
+                                            where ancestor_id = :b_id)
+        """), {'b_id': target.id})
+    # ... and attach it to the ancestors of the new parent
+    connection.execute(
+        text("""insert into organization_closure
+                       (ancestor_id, descendant_id, depth)
+                select p.ancestor_id, c.descendant_id, p.depth + c.depth + 1
+                  from organization_closure p, organization_closure c
+                 where p.descendant_id = :b_parent_org_id
+                   and c.ancestor_id = :b_id
+        """), {'b_id': target.id, 'b_parent_org_id': target.parent_org_id})
+
+
+@event.listens_for(Organization, 'after_insert')
+def _organization_path_insert(mapper, connection, target):
+    path = connection.execute(
+        text("""update organizations
+                   set path = coalesce((select p.path from organizations p
+                                         where p.id = :b_parent_org_id),
+                                       ''::ltree) || cast(id as text)
+                 where id = :b_id
+             returning path
+        """), {'b_id': target.id,
+               'b_parent_org_id': target.parent_org_id}).scalar()
+    set_committed_value(target, 'path', path)
+
+
+@event.listens_for(Organization, 'after_update')
+def _organization_path_move(mapper, connection, target):
+    """Re-path the whole subtree of ``target`` below its new parent"""
+    if not get_history(target, 'parent_org_id').has_changes():
+        return
+
+    results = connection.execute(
+        text("""update organizations o
+                   set path = coalesce((select p.path from organizations p
+                                         where p.id = :b_parent_org_id),
+                                       ''::ltree)
+                              || subpath(o.path, nlevel(m.path) - 1)
+                  from organizations m
+                 where m.id = :b_id
+                   and o.path <@ m.path
+             returning o.id, o.path
+        """), {'b_id': target.id, 'b_parent_org_id': target.parent_org_id})
+    for org_id, path in results:
+        if org_id == target.id:
+            set_committed_value(target, 'path', path)
+
+
+@event.listens_for(Organization, 'after_update')
+def _organization_ip_ranges_invalidate(mapper, connection, target):
+    if get_history(target, 'deleted').has_changes():
+        generations.mark(target, 'ip_ranges')
+
+
+@event.listens_for(Organization, 'after_insert')
+@event.listens_for(Organization, 'after_update')
+def _organization_auth_scope_invalidate(mapper, connection, target):
+    # scopes hold abbreviations and are ordered by them
+    if get_history(target, 'parent_org_id').has_changes() or \
+            get_history(target, 'deleted').has_changes() or \
+            get_history(target, 'abbreviation').has_changes():
+        AuthScope.invalidate(target)
+
 
 class Tag(Model, SerializerMixin):
     __tablename__ = 'tags'
@@ -2047,6 +3030,22 @@ class OrganizationMembership(Model, SerializerMixin):
         return (membership, message)
 
 
+@event.listens_for(OrganizationMembership, 'after_insert')
+@event.listens_for(OrganizationMembership, 'after_update')
+@event.listens_for(OrganizationMembership, 'after_delete')
+def _membership_auth_scope_invalidate(mapper, connection, target):
+    AuthScope.invalidate(target)
+    # abuse-c memberships are part of NotificationSetting.contact_index
+    generations.mark(target, 'notification_settings')
+
+
+@event.listens_for(User, 'after_update')
+def _user_auth_scope_invalidate(mapper, connection, target):
+    # alias users share the scope of the user they belong to
+    if get_history(target, 'alias_user_id').has_changes():
+        AuthScope.invalidate(target)
+
+
 @login_manager.user_loader
 def load_user(user_id):
     """
@@ -64,3 +64,34 @@ def get_hashes(buf):
     sha512 = hashlib.sha512(buf).hexdigest()
     ctph = ssdeep.hash(buf)
     return hexdigests._make((md5, sha1, sha256, sha512, ctph))
+
+
+def replace_stream(chunks, old, new):
+    """Replace ``old`` with ``new`` in a stream of byte chunks, also where
+    ``old`` spans two chunks. At most ``len(old) - 1`` bytes are held back.
+
+    :param chunks: Iterable of ``bytes``
+    :param old: ``bytes`` to replace, must not be empty
+    :param new: Replacement ``bytes``
+    """
+    keep = len(old) - 1
+    tail = b''
+    for chunk in chunks:
+        buf = tail + chunk
+        out = []
+        start = 0
+        pos = buf.find(old)
+        while pos != -1:
+            out.append(buf[start:pos])
+            out.append(new)
+            start = pos + len(old)
+            pos = buf.find(old, start)
+        # the start of a match may be in the last bytes, keep them
+        split = max(len(buf) - keep, start)
+        out.append(buf[start:split])
+        tail = buf[split:]
+        out = b''.join(out)
+        if out:
+            yield out
+    if tail:
+        yield tail
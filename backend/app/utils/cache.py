@@ -0,0 +1,227 @@
+"""
+    Process wide caches
+    ~~~~~~~~~~~~~~~~~~~
+
+    :class:`LRUCache` keeps values across requests inside one worker.
+    Entries are keyed with a *generation* of the data they were built from,
+    so writes only have to bump that generation instead of knowing which
+    entries to drop.
+
+    Generations are kept by :class:`Generations`. With the ``local`` backend
+    they live in the worker process, with the ``database`` backend they are
+    stored in the ``cache_generations`` table and shared by all workers.
+
+    Writes mark the generations they touch on their session
+    (:meth:`Generations.mark`), the generations are bumped once the session
+    commits and forgotten when it rolls back.
+"""
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, object_session
+from flask_sqlalchemy import SignallingSession
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    """Thread safe least recently used cache
+
+    :param maxsize: Maximum number of entries, or maximum total weight if
+        ``weigh`` is given
+    :param ttl: Seconds after which an entry expires, ``None`` to keep
+        entries until they are evicted
+    :param weigh: Function returning the weight of a value, e.g. ``len``
+        to limit the cache by bytes. Heavier values than ``maxsize`` are
+        not stored.
+    """
+
+    def __init__(self, maxsize=128, ttl=None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigh = weigh
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value, weight = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = None
+        if self.ttl is not None:
+            expires = time.monotonic() + self.ttl
+        weight = self.weigh(value) if self.weigh else 1
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if weight > self.maxsize:
+                return
+            self._data[key] = (expires, value, weight)
+            self.weight += weight
+            while self.weight > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def _remove(self, key):
+        expires, value, weight = self._data.pop(key)
+        self.weight -= weight
+        return value
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Hit and miss counters of this cache
+
+        :return: dict with ``hits``, ``misses``, ``size``, ``weight`` and
+            ``maxsize``
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data), 'weight': self.weight,
+                'maxsize': self.maxsize}
+
+
+class LocalGenerationStore(object):
+    """Generations kept in the current process"""
+
+    def __init__(self):
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, max_age=0):
+        return self._generations.get(name, 0)
+
+    def bump(self, name):
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+
+class DatabaseGenerationStore(object):
+    """Generations stored in the ``cache_generations`` table
+
+    :param db: :class:`flask_sqlalchemy.SQLAlchemy` instance
+    """
+
+    def __init__(self, db):
+        self.db = db
+        #: name: ``(monotonic read time, generation)`` of the last read
+        self._read = {}
+
+    def get(self, name, max_age=0):
+        if max_age:
+            entry = self._read.get(name)
+            if entry is not None and entry[0] + max_age > time.monotonic():
+                return entry[1]
+        generation = self.db.engine.execute(
+            text("""select generation from cache_generations
+                     where name = :b_name"""), {'b_name': name}).scalar()
+        generation = generation or 0
+        self._read[name] = (time.monotonic(), generation)
+        return generation
+
+    def bump(self, name):
+        generation = self.db.engine.execute(
+            text("""insert into cache_generations (name, generation)
+                    values (:b_name, 1)
+                    on conflict (name) do update
+                    set generation = cache_generations.generation + 1
+                    returning generation
+            """), {'b_name': name}).scalar()
+        # bumps of this worker are seen at once, also with max_age
+        self._read[name] = (time.monotonic(), generation)
+
+
+class Generations(object):
+    """Flask extension handing out cache generations
+
+    Set ``CACHE_GENERATION_BACKEND`` to ``local`` or ``database``.
+    """
+
+    #: ``session.info`` key of the generations to bump on commit
+    SESSION_KEY = '_cache_generations'
+
+    def __init__(self, db, app=None):
+        self.db = db
+        self.store = LocalGenerationStore()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_GENERATION_BACKEND', 'local')
+        if backend == 'database':
+            self.store = DatabaseGenerationStore(self.db)
+        elif backend == 'local':
+            self.store = LocalGenerationStore()
+        else:
+            raise ValueError('Unknown cache generation backend', backend)
+        if not event.contains(SignallingSession, 'after_commit',
+                              self._after_commit):
+            event.listen(SignallingSession, 'after_commit',
+                         self._after_commit)
+            event.listen(SignallingSession, 'after_soft_rollback',
+                         self._after_rollback)
+
+    def get(self, name, max_age=0):
+        """Current generation of ``name``
+
+        :param max_age: Seconds a generation read from the ``database``
+            backend may be reused by this worker, so hot lookups need no
+            round trip. Bumps of other workers are seen that much later;
+            never use it for authorization data such as ``org_tree``.
+        """
+        return self.store.get(name, max_age)
+
+    def bump(self, name):
+        """Invalidate all entries built from generation ``name``"""
+        self.store.bump(name)
+
+    def mark(self, target, name):
+        """Bump ``name`` when the session of ``target`` commits
+
+        :param target: Session or mapped instance which was written
+        """
+        session = target
+        if not isinstance(target, Session):
+            session = object_session(target)
+        if session is None:
+            self.bump(name)
+            return
+        session.info.setdefault(self.SESSION_KEY, set()).add(name)
+
+    def pending(self, session, name):
+        """``True`` if ``session`` holds uncommitted writes to ``name``"""
+        return name in session.info.get(self.SESSION_KEY, ())
+
+    def _after_commit(self, session):
+        for name in session.info.pop(self.SESSION_KEY, ()):
+            self.bump(name)
+
+    def _after_rollback(self, session, previous_transaction):
+        # a rolled back savepoint leaves the outer writes in place
+        if previous_transaction.nested:
+            return
+        session.info.pop(self.SESSION_KEY, None)
@@ -0,0 +1,149 @@
+"""
+    IP interval index
+    ~~~~~~~~~~~~~~~~~
+
+    Longest-prefix lookups of IP addresses and CIDRs against a set of
+    networks. CIDRs are either nested or disjoint, so they are flattened
+    into sorted, non overlapping ``[start, end]`` segments, each pointing to
+    the most specific network covering it. An address is resolved with one
+    :func:`bisect.bisect_right` on the segment starts.
+"""
+import ipaddress
+import socket
+from bisect import bisect_right
+
+
+def _parse_address(address):
+    """Return ``(version, int)`` of an address string.
+    :func:`socket.inet_pton` is a lot faster than :mod:`ipaddress`.
+    """
+    try:
+        if ':' in address:
+            return 6, int.from_bytes(
+                socket.inet_pton(socket.AF_INET6, address), 'big')
+        return 4, int.from_bytes(
+            socket.inet_pton(socket.AF_INET, address), 'big')
+    except OSError:
+        raise ValueError('Invalid IP address', address)
+
+
+class _Family(object):
+    """Networks and segments of one address family"""
+
+    def __init__(self, networks):
+        #: start, end, value and parent network index of each network
+        self.net_start = []
+        self.net_end = []
+        self.net_value = []
+        self.net_parent = []
+        #: sorted segment starts, segment ends and their network index
+        self.starts = []
+        self.ends = []
+        self.nets = []
+
+        # parents sort before their children
+        networks = sorted(networks, key=lambda n: (n[0], -n[1]))
+        stack = []
+        pos = None
+        for start, end, value in networks:
+            while stack and self.net_end[stack[-1]] < start:
+                pos = self._close(stack.pop(), pos)
+            if stack:
+                self._segment(pos, start - 1, stack[-1])
+            pos = start
+
+            idx = len(self.net_start)
+            self.net_start.append(start)
+            self.net_end.append(end)
+            self.net_value.append(value)
+            self.net_parent.append(stack[-1] if stack else -1)
+            stack.append(idx)
+        while stack:
+            pos = self._close(stack.pop(), pos)
+
+    def _segment(self, start, end, net):
+        if start <= end:
+            self.starts.append(start)
+            self.ends.append(end)
+            self.nets.append(net)
+
+    def _close(self, net, pos):
+        self._segment(pos, self.net_end[net], net)
+        return self.net_end[net] + 1
+
+    def find(self, start, end):
+        """Index of the most specific network containing ``[start, end]``"""
+        i = bisect_right(self.starts, start) - 1
+        if i < 0 or start > self.ends[i]:
+            return -1
+        net = self.nets[i]
+        while net != -1 and self.net_end[net] < end:
+            net = self.net_parent[net]
+        return net
+
+
+class IntervalIndex(object):
+    """Longest-prefix match index of IPv4 and IPv6 networks
+
+    :param networks: Iterable of ``(cidr, value)`` pairs. ``cidr`` may be a
+        string or an :mod:`ipaddress` network, host bits are ignored.
+        If the same network is given twice, the last value wins.
+    """
+
+    def __init__(self, networks=()):
+        families = {4: [], 6: []}
+        for cidr, value in networks:
+            if not isinstance(cidr, (ipaddress.IPv4Network,
+                                     ipaddress.IPv6Network)):
+                cidr = ipaddress.ip_network(cidr.strip(), strict=False)
+            families[cidr.version].append(
+                (int(cidr.network_address), int(cidr.broadcast_address),
+                 value))
+        self.size = len(families[4]) + len(families[6])
+        self._families = {version: _Family(nets)
+                          for version, nets in families.items()}
+
+    def __len__(self):
+        return self.size
+
+    def lookup(self, address, default=None):
+        """Value of the most specific network containing ``address``
+
+        :param address: IP address or CIDR, as string or :mod:`ipaddress`
+            object. A CIDR only matches networks containing all of it.
+        :raises ValueError: if ``address`` is neither
+        """
+        if isinstance(address, str):
+            address = address.strip()
+            if '/' in address:
+                address = ipaddress.ip_network(address, strict=False)
+            else:
+                version, start = _parse_address(address)
+                return self._find(version, start, start, default)
+        if isinstance(address, (ipaddress.IPv4Network,
+                                ipaddress.IPv6Network)):
+            return self._find(address.version,
+                              int(address.network_address),
+                              int(address.broadcast_address), default)
+        return self._find(address.version, int(address), int(address),
+                          default)
+
+    def _find(self, version, start, end, default):
+        family = self._families[version]
+        net = family.find(start, end)
+        if net == -1:
+            return default
+        return family.net_value[net]
+
+    def lookup_many(self, addresses, default=None):
+        """:meth:`lookup` every address, invalid ones resolve to ``default``
+
+        :return: list of values in the order of ``addresses``
+        """
+        rv = []
+        for address in addresses:
+            try:
+                rv.append(self.lookup(address, default))
+            except ValueError:
+                rv.append(default)
+        return rv
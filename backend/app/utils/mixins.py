@@ -2,36 +2,88 @@ from flask import current_app
 from flask_login import AnonymousUserMixin
 from datetime import datetime, date
 from decimal import Decimal
+from collections import OrderedDict
+from sqlalchemy.orm import class_mapper, ColumnProperty, load_only, \
+    noload, subqueryload, joinedload
+from sqlalchemy.sql import sqltypes
+
+
+def _identity(value):
+    return value
+
+
+def _isoformat(value):
+    if type(value) in (datetime, date):
+        return value.isoformat()
+    return value
+
+
+def _decimal(value):
+    if type(value) is Decimal:
+        return str(value)
+    return value
+
+
+#: converters of column types, values of other types go through
+#: :meth:`SerializerMixin._serialize`
+_CONVERTERS = (
+    (sqltypes.Boolean, None),
+    (sqltypes.Integer, None),
+    (sqltypes.String, None),
+    (sqltypes.Numeric, _decimal),
+    (sqltypes.DateTime, _isoformat),
+    (sqltypes.Date, _isoformat),
+)
 
 
 class SerializerMixin(object):
     __public__ = None
     """Must be implemented by implementors"""
 
+    #: mapped attributes public names are read from, if they are not mapped
+    #: attributes themselves, e.g. ``{'ip_ranges': ('ip_ranges_',)}``
+    __field_attrs__ = {}
+
+    #: named loader profiles, query options for one kind of use, see
+    #: :meth:`loader_profile`
+    __loader_profiles__ = {}
+
+    @classmethod
+    def query_options(cls, fields, profile):
+        """:meth:`field_options` of ``fields`` if any are requested, the
+        loader profile ``profile`` otherwise
+        """
+        if fields:
+            return cls.field_options(fields)
+        return cls.loader_profile(profile)
+
+    @classmethod
+    def loader_profile(cls, name):
+        """Query options of the loader profile ``name``, e.g. ``list``,
+        ``detail`` or ``auth-check``. Models without such a profile get
+        no options, relationships are then loaded as declared.
+        """
+        return list(cls.__loader_profiles__.get(name, ()))
+
     def _get_fields(self):
         for f in self.__mapper__.iterate_properties:
             yield f.key
 
-    def serialize(self, exclude=(), extra=()):
+    def serialize(self, exclude=(), extra=(), fields=None):
         """Returns model's public data for jsonify
         :param set exclude: Exclude these items from serialization
         :param set extra: Include these items for serialization
+        :param fields: Serialize only these public items, see
+            :meth:`field_options`
         :return: dictionary to be passed to jsonify
         :rtype: dict
         """
         data = {}
-        keys = self._sa_instance_state.attrs.items()
-        public = self.__public__ + extra if self.__public__ else extra
-        for k, field in keys:
-            if public and k not in public:
-                continue
-            if exclude and k in exclude:
-                continue
-            value = self._serialize(field.value)
+        attrs, extras = self._serializer_plan(exclude, extra, fields)
+        for k, convert in attrs:
+            value = convert(getattr(self, k))
             if value:
                 data[k] = value
-        extras = list(set(public).difference(
-            self._sa_instance_state.attrs.keys()))
         for e in extras:
             try:
                 data[e] = self._serialize(getattr(self, e))
@@ -40,6 +92,95 @@ class SerializerMixin(object):
 
         return data
 
+    @classmethod
+    def preload(cls, objs):
+        """Load what serializing ``objs`` needs in bulk. Models whose
+        serialization queries per row override this.
+
+        :return: ``objs`` as a list
+        """
+        return list(objs)
+
+    @classmethod
+    def field_options(cls, fields, collections=True):
+        """Query options loading only what serializing ``fields`` needs.
+        Requested relationships are eager loaded, the others not at all.
+
+        :param fields: Names out of ``__public__``
+        :param collections: Eager load requested collections too. Queries
+            read with ``yield_per`` leave them to :meth:`preload`.
+        :raises ValueError: if a name is not public
+        :return: list of loader options
+        """
+        unknown = [f for f in fields if f not in (cls.__public__ or ())]
+        if unknown:
+            raise ValueError('unknown fields', unknown)
+        attrs = set()
+        for f in fields:
+            attrs.update(cls.__field_attrs__.get(f, (f,)))
+
+        mapper = class_mapper(cls)
+        columns = [p.key for p in mapper.column_attrs if p.key in attrs]
+        if not columns:
+            columns = [mapper.get_property_by_column(mapper.primary_key[0]).key]
+        options = [load_only(*columns)]
+        for rel in mapper.relationships:
+            if rel.key in attrs:
+                if not rel.uselist:
+                    options.append(joinedload(rel.key))
+                elif collections:
+                    options.append(subqueryload(rel.key))
+            elif rel.lazy != 'dynamic':
+                options.append(noload(rel.key))
+        return options
+
+    @classmethod
+    def _serializer_plan(cls, exclude=(), extra=(), fields=None):
+        """``(attributes, extras)`` to serialize, compiled once per
+        ``__public__`` (or ``fields``), ``exclude`` and ``extra`` and cached
+        on the class. ``attributes`` are ``(key, converter)`` pairs of
+        mapped attributes, ``extras`` the other public names, e.g.
+        properties.
+        """
+        if fields:
+            public = tuple(fields)
+        else:
+            public = tuple(cls.__public__ or ()) + tuple(extra or ())
+        key = (public, frozenset(exclude or ()))
+        plans = cls.__dict__.get('_serializer_plans')
+        if plans is None:
+            plans = {}
+            setattr(cls, '_serializer_plans', plans)
+        plan = plans.get(key)
+        if plan is None:
+            plan = cls._compile_serializer_plan(public, key[1])
+            plans[key] = plan
+        return plan
+
+    @classmethod
+    def _compile_serializer_plan(cls, public, exclude):
+        mapper = class_mapper(cls)
+        keys = list(cls._sa_class_manager)
+        attrs = []
+        for k in keys:
+            if public and k not in public:
+                continue
+            if exclude and k in exclude:
+                continue
+            convert = cls._serialize
+            prop = mapper.attrs.get(k)
+            if isinstance(prop, ColumnProperty) and len(prop.columns) == 1:
+                column_type = prop.columns[0].type
+                for type_, converter in _CONVERTERS:
+                    if isinstance(column_type, type_):
+                        convert = converter or _identity
+                        break
+            attrs.append((k, convert))
+        extras = [e for e in public if e not in set(keys)]
+        # the same name twice in ``public`` is serialized once
+        extras = list(OrderedDict.fromkeys(extras))
+        return tuple(attrs), tuple(extras)
+
     @classmethod
     def _serialize(cls, value):
         """Serialize value based its type
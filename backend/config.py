@@ -225,6 +225,51 @@ class Config:
 
     PROXIES = {}
 
+    #: Where cache generations are kept: ``local`` (per worker) or
+    #: ``database`` (shared by all workers)
+    CACHE_GENERATION_BACKEND = 'local'
+    #: Seconds a worker reuses the ``fody`` and ``notification_settings``
+    #: generations in contact lookups, which then need no database round
+    #: trip. Authorization scopes always read their generation.
+    CONTACT_GENERATION_MAX_AGE = 2
+    #: Number of OrgAdmin authorization scopes cached per worker
+    AUTH_SCOPE_CACHE_SIZE = 512
+    #: Number of RIPE (fody) handles cached per worker
+    FODY_CACHE_SIZE = 4096
+    #: Seconds a cached RIPE handle is used before it is read again.
+    #: ``manage.py invalidate_fody`` drops the cache at once.
+    FODY_CACHE_TTL = 3600
+    #: Number of per scope ASN sets (Grafana statistics) cached per worker
+    ASN_SET_CACHE_SIZE = 256
+    #: Most ASNs listed as ``var-asn`` in a statistics URL. 400 ASNs keep
+    #: the URL below the common 8 KiB limit. Larger scopes are handed over
+    #: as ``var-asnscope`` if ``GRAFANA_ASN_DATASOURCE`` is set, else they
+    #: are listed anyway.
+    GRAFANA_MAX_URL_ASNS = 400
+    #: The dashboard reads the ``asn`` variable from the
+    #: ``/statistics/datasource`` JSON datasource, see docs/02_EVENTDB.md
+    GRAFANA_ASN_DATASOURCE = False
+    #: Keep-alive connections to Grafana per worker
+    GRAFANA_POOL_SIZE = 32
+    #: Bytes read from Grafana at once by the proxy
+    GRAFANA_CHUNK_SIZE = 64 * 1024
+    #: Grafana paths whose responses are cached by the proxy. Grafana
+    #: serves its frontend from ``public/``, built files have hashed names.
+    GRAFANA_STATIC_PATHS = ('public/build/', 'public/fonts/', 'public/img/',
+                            'public/lib/')
+    #: Bytes of Grafana assets cached per worker
+    GRAFANA_STATIC_CACHE_BYTES = 64 * 1024 * 1024
+    #: Seconds a cached Grafana asset is used before it is fetched again
+    GRAFANA_STATIC_CACHE_TTL = 3600
+    #: Larger Grafana assets are streamed instead of cached, in bytes
+    GRAFANA_STATIC_MAX_SIZE = 4 * 1024 * 1024
+    #: ``Cache-Control: max-age`` sent with cached Grafana assets
+    GRAFANA_STATIC_MAX_AGE = 86400
+    #: Rows read and written at once by streamed JSON lists
+    API_STREAM_BATCH_SIZE = 500
+    #: Lines resolved at once by the streaming NDJSON endpoints
+    NDJSON_BATCH_SIZE = 1000
+
 
 class DevelConfig(Config):
     DEBUG = True
@@ -253,6 +298,7 @@ class TestingConfig(Config):
     MAIL_DEFAULT_SENDER='testing@test.at'
 
 class ProductionConfig(Config):
+    CACHE_GENERATION_BACKEND = 'database'
     JSON_AS_ASCII = False
     JSONIFY_PRETTYPRINT_REGULAR = False
     CSRF_ENABLED = True
@@ -47,6 +47,7 @@ if [ $select_fody_table = 'f' ]; then
   PGPASSWORD=do_portal dropdb -U do_portal -h portal-db do_portal;
   echo '### createdb'
   PGPASSWORD=do_portal createdb -U do_portal -h portal-db -O do_portal do_portal;
+  PGPASSWORD=do_portal psql -U do_portal -h portal-db -d do_portal -c "CREATE EXTENSION IF NOT EXISTS ltree";
   mv misc/migrations misc/tmp-migrations # TODO remove hack
   echo '### init'
   python3 manage.py db init;
@@ -72,6 +73,8 @@ if [ $select_fody_table = 'f' ]; then
   #    `sed -i 's/public\./fody./g' install/contactdb_schema_only.pgdump`
   PGPASSWORD=do_portal psql -U do_portal -h portal-db -c "CREATE SCHEMA fody";
   PGPASSWORD=do_portal psql -U do_portal -h portal-db -d do_portal --echo-errors --file=install/contactdb_schema_only.pgdump
+  echo '### refresh_fody_contacts'
+  python3 manage.py refresh_fody_contacts
 fi
 
 export FLASK_DEBUG=1
@@ -10,11 +10,12 @@ import click
 from app import create_app
 from flask import current_app
 from flask.cli import FlaskGroup
-from app import db
+from app import db, generations
 from app.models import User, Organization, IpRange, Fqdn, Asn, Email
 from app.models import OrganizationGroup, Vulnerability, Tag
 from app.models import ContactEmail, emails_organizations, tags_vulnerabilities
 from app.models import Role, ReportType, MembershipRole, Country
+from app.models import FodyOrganization
 from app.fixtures import testfixture
 
 
@@ -145,6 +146,31 @@ def initializedb():
     click.echo('Done')
 
 
+@cli.command()
+def rebuild_org_closure():
+    """Rebuild the organization hierarchy closure table and paths"""
+    Organization.rebuild_closure()
+    Organization.rebuild_paths()
+    db.session.commit()
+    click.echo('Done')
+
+
+@cli.command()
+def invalidate_fody():
+    """Reload RIPE (fody) data in all workers, run after an import"""
+    generations.bump('fody')
+    click.echo('Done')
+
+
+@cli.command()
+def refresh_fody_contacts():
+    """Refresh the RIPE (fody) abuse contacts view, run after an import"""
+    FodyOrganization.refresh_abuse_contacts()
+    db.session.commit()
+    generations.bump('fody')
+    click.echo('Done')
+
+
 @cli.command()
 def insertmasteruser():
     testfixture.testdata.addyaml("install/master_user.yaml")
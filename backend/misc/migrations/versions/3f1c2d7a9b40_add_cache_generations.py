@@ -0,0 +1,27 @@
+"""Add cache_generations
+
+Revision ID: 3f1c2d7a9b40
+Revises: 9aaf55cbd3e8
+Create Date: 2026-10-18 10:02:17.482911
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2d7a9b40'
+down_revision = '9aaf55cbd3e8'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'cache_generations',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('generation', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_generations')
@@ -0,0 +1,50 @@
+"""Store ip_ranges.ip_range as cidr
+
+Revision ID: 5b07d3e9c2aa
+Revises: c4e81a2f6d15
+Create Date: 2026-10-18 12:41:36.907112
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b07d3e9c2aa'
+down_revision = 'c4e81a2f6d15'
+
+from alembic import op
+import sqlalchemy as sa
+import ipaddress
+
+
+def upgrade():
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.text('select id, ip_range from ip_ranges')).fetchall()
+    invalid = []
+    for row_id, ip_range in rows:
+        if ip_range is None:
+            continue
+        try:
+            normalized = str(ipaddress.ip_network(ip_range.strip(),
+                                                  strict=False))
+        except ValueError:
+            invalid.append((row_id, ip_range))
+            continue
+        if normalized != ip_range:
+            conn.execute(
+                sa.text('update ip_ranges set ip_range = :b_ip_range '
+                        'where id = :b_id'),
+                {'b_ip_range': normalized, 'b_id': row_id})
+    if invalid:
+        raise ValueError('Fix or delete these ip_ranges rows first', invalid)
+
+    op.execute('alter table ip_ranges '
+               'alter column ip_range type cidr using ip_range::cidr')
+    op.create_index('ix_ip_ranges_ip_range', 'ip_ranges', ['ip_range'],
+                    unique=False, postgresql_using='gist',
+                    postgresql_ops={'ip_range': 'inet_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_ip_ranges_ip_range', table_name='ip_ranges')
+    op.execute('alter table ip_ranges '
+               'alter column ip_range type varchar(255) using ip_range::text')
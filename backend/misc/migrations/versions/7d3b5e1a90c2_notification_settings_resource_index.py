@@ -0,0 +1,51 @@
+"""Add unique index on active notification settings per resource
+
+Replaces the table wide unique constraint on ``asn``.
+
+Revision ID: 7d3b5e1a90c2
+Revises: e2a9c4b71f08
+Create Date: 2026-10-18 15:22:47.301845
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d3b5e1a90c2'
+down_revision = 'e2a9c4b71f08'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # replaced by the index below: the same ASN may be set for several
+    # organizations and again after its setting was deleted
+    op.execute("""
+        alter table notification_settings
+              drop constraint if exists notification_settings_asn_key
+    """)
+    # keep the newest of duplicated active settings
+    op.execute("""
+        update notification_settings ns
+           set deleted = 1
+          from notification_settings newer
+         where newer.id > ns.id
+           and newer.deleted = 0 and ns.deleted = 0
+           and newer.organization_id is not distinct from ns.organization_id
+           and newer.ripe_org_hdl is not distinct from ns.ripe_org_hdl
+           and newer.asn is not distinct from ns.asn
+           and newer.cidr is not distinct from ns.cidr
+    """)
+    op.execute("""
+        create unique index ix_notification_settings_resource
+            on notification_settings
+               (organization_id, ripe_org_hdl, coalesce(asn, ''),
+                coalesce(cidr, cast('0.0.0.0/0' as cidr)))
+         where deleted = 0
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_notification_settings_resource',
+                  table_name='notification_settings')
+    op.create_unique_constraint('notification_settings_asn_key',
+                                'notification_settings', ['asn'])
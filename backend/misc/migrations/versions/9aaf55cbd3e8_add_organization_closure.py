@@ -0,0 +1,53 @@
+"""Add organization_closure
+
+Revision ID: 9aaf55cbd3e8
+Revises: None
+Create Date: 2026-10-18 09:12:41.113245
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9aaf55cbd3e8'
+down_revision = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'organization_closure',
+        sa.Column('ancestor_id', sa.Integer(), nullable=False),
+        sa.Column('descendant_id', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ancestor_id'], ['organizations.id'],
+                                ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['descendant_id'], ['organizations.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index(
+        'ix_organization_closure_descendant_id',
+        'organization_closure',
+        ['descendant_id', 'ancestor_id'],
+        unique=False
+    )
+    # backfill from the existing parent_org_id hierarchy
+    op.execute("""
+        insert into organization_closure (ancestor_id, descendant_id, depth)
+        with recursive tree (ancestor_id, descendant_id, depth) as (
+             select id, id, 0 from organizations
+             union all
+             select t.ancestor_id, o.id, t.depth + 1
+               from organizations o
+               join tree t on t.descendant_id = o.parent_org_id)
+        select ancestor_id, descendant_id, min(depth)
+          from tree
+      group by ancestor_id, descendant_id
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_organization_closure_descendant_id',
+                  table_name='organization_closure')
+    op.drop_table('organization_closure')
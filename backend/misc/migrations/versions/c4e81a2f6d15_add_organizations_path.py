@@ -0,0 +1,40 @@
+"""Add organizations.path
+
+Revision ID: c4e81a2f6d15
+Revises: 3f1c2d7a9b40
+Create Date: 2026-10-18 11:20:05.318804
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c4e81a2f6d15'
+down_revision = '3f1c2d7a9b40'
+
+from alembic import op
+import sqlalchemy as sa
+from app.models import Ltree
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS ltree')
+    op.add_column('organizations', sa.Column('path', Ltree(), nullable=True))
+    op.create_index('ix_organizations_path', 'organizations', ['path'],
+                    unique=False, postgresql_using='gist')
+    op.execute("""
+        with recursive tree (id, path) as (
+             select id, text2ltree(cast(id as text))
+               from organizations
+              where parent_org_id is null
+             union all
+             select o.id, t.path || cast(o.id as text)
+               from organizations o
+               join tree t on t.id = o.parent_org_id)
+        update organizations o set path = tree.path
+          from tree
+         where tree.id = o.id
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_organizations_path', table_name='organizations')
+    op.drop_column('organizations', 'path')
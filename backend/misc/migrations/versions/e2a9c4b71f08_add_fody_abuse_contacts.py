@@ -0,0 +1,32 @@
+"""Add fody_abuse_contacts materialized view
+
+Revision ID: e2a9c4b71f08
+Revises: 5b07d3e9c2aa
+Create Date: 2026-10-18 14:05:12.518330
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e2a9c4b71f08'
+down_revision = '5b07d3e9c2aa'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    from app.models import FODY_ABUSE_CONTACTS_DDL
+    conn = op.get_bind()
+    fody = conn.execute(
+        sa.text("""select exists (
+                   select 1 from information_schema.tables
+                    where table_schema = 'fody'
+                      and table_name = 'organisation_automatic')
+        """)).scalar()
+    # without the RIPE schema manage.py refresh_fody_contacts creates it
+    if fody:
+        op.execute(FODY_ABUSE_CONTACTS_DDL)
+
+
+def downgrade():
+    op.execute('drop materialized view if exists fody_abuse_contacts')
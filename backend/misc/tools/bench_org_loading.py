@@ -0,0 +1,82 @@
+"""
+    Organization loading benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Counts statements and result rows of typical ``Organization`` queries
+    with the former global ``lazy='joined'`` relationships (emulated with
+    ``joinedload`` options) against the loader profiles. Load data with
+    ``insert_mass_data.sql`` first, then run from ``backend/``::
+
+        DO_CONFIG=devel python misc/tools/bench_org_loading.py [org_id]
+"""
+import os
+import sys
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app import create_app, db  # noqa
+from app.models import Organization  # noqa
+
+
+def legacy_options():
+    """Eager loads as declared before the loader profiles"""
+    child_orgs = joinedload('child_orgs')
+    path = child_orgs
+    for _ in range(4):
+        path = path.joinedload('child_orgs')
+    return [joinedload('ip_ranges_'), joinedload('abuse_emails_'),
+            joinedload('asns_'), joinedload('fqdns_'),
+            joinedload('contact_emails'), child_orgs]
+
+
+class Counter(object):
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.rows = 0
+        event.listen(engine, 'after_cursor_execute', self.executed)
+
+    def executed(self, conn, cursor, statement, parameters, context,
+                 executemany):
+        self.statements += 1
+        if cursor.rowcount > 0 and statement.lstrip().lower().startswith(
+                'select'):
+            self.rows += cursor.rowcount
+
+    def measure(self, name, fn):
+        db.session.expunge_all()
+        statements, rows = self.statements, self.rows
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        print('%-34s %6d statements %9d rows %9.1f ms' % (
+            name, self.statements - statements, self.rows - rows,
+            elapsed * 1000))
+
+
+def main(org_id):
+    counter = Counter(db.engine)
+    query = Organization.query
+
+    counter.measure('list, joined', lambda: [
+        o.serialize() for o in query.options(*legacy_options())])
+    counter.measure('list, profile "list"', lambda: [
+        o.serialize() for o in query.options(
+            *Organization.loader_profile('list'))])
+    counter.measure('detail, joined', lambda: query.options(
+        *legacy_options()).get(org_id).serialize())
+    counter.measure('detail, profile "detail"', lambda: query.options(
+        *Organization.loader_profile('detail')).get(org_id).serialize())
+    counter.measure('auth check, joined', lambda: query.options(
+        *legacy_options()).get(org_id).id)
+    counter.measure('auth check, profile "auth-check"', lambda: query.options(
+        *Organization.loader_profile('auth-check')).get(org_id).id)
+
+
+if __name__ == '__main__':
+    app = create_app(os.getenv('DO_CONFIG') or 'default')
+    with app.app_context():
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
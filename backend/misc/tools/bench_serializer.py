@@ -0,0 +1,69 @@
+"""
+    Serializer benchmark
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Times :meth:`SerializerMixin.serialize` with compiled plans against the
+    previous per call implementation on ``Organization`` and
+    ``OrganizationMembership`` lists. Rows are loaded once, so only
+    serialization is measured. Load data with ``insert_mass_data.sql``
+    first, then run from ``backend/``::
+
+        DO_CONFIG=devel python misc/tools/bench_serializer.py [rows] [repeat]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app import create_app  # noqa
+from app.models import Organization, OrganizationMembership  # noqa
+
+
+def legacy_serialize(obj, exclude=(), extra=()):
+    """``SerializerMixin.serialize`` before serializer plans"""
+    data = {}
+    keys = obj._sa_instance_state.attrs.items()
+    public = obj.__public__ + extra if obj.__public__ else extra
+    for k, field in keys:
+        if public and k not in public:
+            continue
+        if exclude and k in exclude:
+            continue
+        value = obj._serialize(field.value)
+        if value:
+            data[k] = value
+    extras = list(set(public).difference(
+        obj._sa_instance_state.attrs.keys()))
+    for e in extras:
+        try:
+            data[e] = obj._serialize(getattr(obj, e))
+        except AttributeError:
+            pass
+    return data
+
+
+def bench(model, rows, repeat):
+    objs = model.query.limit(rows).all()
+    # load lazy attributes once, they are not what is measured
+    for o in objs:
+        o.serialize()
+    assert [legacy_serialize(o) for o in objs] == \
+        [o.serialize() for o in objs]
+
+    legacy = min(timeit.repeat(
+        lambda: [legacy_serialize(o) for o in objs], number=1, repeat=repeat))
+    compiled = min(timeit.repeat(
+        lambda: [o.serialize() for o in objs], number=1, repeat=repeat))
+    print('%-24s %6d rows  legacy %8.2f ms  compiled %8.2f ms  %5.1fx' % (
+        model.__name__, len(objs), legacy * 1000, compiled * 1000,
+        legacy / compiled if compiled else 0))
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    app = create_app(os.getenv('DO_CONFIG') or 'default')
+    with app.app_context():
+        bench(Organization, rows, repeat)
+        bench(OrganizationMembership, rows, repeat)
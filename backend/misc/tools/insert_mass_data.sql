@@ -11,3 +11,6 @@ with recursive iter (n, organization_id, membership_role_id, email, deleted, use
     select n+1, __FIRST_ORG_ID__+n+1, 1, 'massorgmail' || n+1 || '@example.com', 0, __USER_ACCOUNT__ from iter where n < 5000)
     insert into organization_memberships (organization_id, membership_role_id, email, deleted, user_id)
     select organization_id, membership_role_id, email, deleted, user_id from iter;
+
+-- organizations were inserted without the ORM, afterwards run
+--     python manage.py rebuild_org_closure
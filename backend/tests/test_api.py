@@ -1,5 +1,7 @@
+import pytest
 from io import BytesIO
-from flask import url_for
+from flask import url_for, json
+from app.core import ApiStreamResponse
 from .conftest import assert_msg
 
 
@@ -13,6 +15,13 @@ def test_get_samples(client):
     assert_msg(rv, key='items')
 
 
+def test_get_samples_fields(client):
+    rv = client.get(url_for('api.get_samples', fields='id,sha256'))
+    assert_msg(rv, key='items')
+    rv = client.get(url_for('api.get_samples', fields='id,nope'))
+    assert rv.status_code == 400
+
+
 def test_get_sample(client):
     rv = client.get(url_for('api.get_sample', digest=1))
     # topic-postgres # rv = client.get(url_for('api.get_sample', sha256=1))
@@ -41,3 +50,29 @@ def test_teapot(client):
 def test_honeytoken(client):
     rv = client.get(url_for('api.api_honeytoken'))
     assert_msg(rv, value='No such user')
+
+
+def test_stream_response(app):
+    def serialize(item):
+        if item == 'bad':
+            raise ValueError(item)
+        return {'item': item}
+
+    with app.test_request_context():
+        rv = ApiStreamResponse('items', [], serialize=serialize).to_response()
+        assert rv.status_code == 200
+        assert json.loads(rv.get_data()) == {'items': []}
+
+        rv = ApiStreamResponse('items', ['a', 'b', 'c'], serialize=serialize,
+                               batch_size=2).to_response()
+        assert json.loads(rv.get_data()) == \
+            {'items': [{'item': 'a'}, {'item': 'b'}, {'item': 'c'}]}
+
+        # the first batch fails inside the view, before any header is sent
+        with pytest.raises(ValueError):
+            ApiStreamResponse('items', ['bad'], serialize=serialize)
+
+        rv = ApiStreamResponse('items', ['a', 'bad'], serialize=serialize,
+                               batch_size=1).to_response()
+        with pytest.raises(ValueError):
+            rv.get_data()
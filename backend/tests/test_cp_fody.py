@@ -1,4 +1,4 @@
-from flask import url_for
+from flask import url_for, current_app
 from .conftest import assert_msg
 from pprint import pprint
 from app.models import User, Organization
@@ -42,6 +42,11 @@ def test_create_setting(client):
 
     assert rv.json['cidrs'][0]['notification_setting']['notification_interval'] ==  815
 
+    rv = client.get(url_for('cp.get_cp_org_settings', org_id=org.id))
+    settings = rv.json['ripe_settings']['ORG-AA83-RIPE']
+    assert settings['cidrs'][0]['notification_setting']['notification_interval'] == 815
+    assert settings['asns'][0]['asn'] == '29429'
+
     cidr = quote('195.245.92.0/23', safe='')
     rv = client.get(url_for('cp.get_cp_contact_for_netblock',
                             cidr=cidr))
@@ -65,3 +70,80 @@ def test_create_setting(client):
     rv = client.get(url_for('cp.get_cp_contact_for_netblock',
                             cidr=cidr))
     assert rv.status_code == 404
+
+    rv = client.get(url_for('cp.get_cp_contact_for_netblock', asn='AS29429'))
+    assert rv.json['notification_setting']['organization_id'] == org.id
+    assert rv.json['notification_setting']['asn'] == '29429'
+    assert rv.json['abusecs'] == ['abuse@nextlayer.at']
+
+    rv = client.get(url_for('cp.get_cp_contact_for_netblock', asn='AS0'))
+    assert rv.status_code == 404
+
+    rv = client.post(url_for('cp.get_cp_contacts'),
+                     json={'asns': ['AS29429', 'AS0'],
+                           'cidrs': ['195.245.92.0/24', '1.2.2.3aa']})
+    assert rv.json['asns']['AS29429']['abusecs'] == ['abuse@nextlayer.at']
+    assert rv.json['asns']['AS0'] is None
+    assert rv.json['cidrs']['195.245.92.0/24']['notification_setting'] \
+        ['organization_id'] == org.id
+    assert rv.json['cidrs']['1.2.2.3aa'] is None
+
+
+def test_statistics_asns(client, monkeypatch):
+    rv = client.post(
+        url_for('cp.add_cp_organization'),
+        json=dict(abbreviation="statistics-org",
+                  full_name="statistics-org",
+                  parent_org_id=client.test_user.organization_id,
+                  ripe_handles=['ORG-AA83-RIPE'])
+    )
+    org = Organization.query.filter_by(abbreviation='statistics-org').one()
+
+    rv = client.get(url_for('cp.get_grafana', orgid=org.id))
+    assert rv.status_code == 200
+    assert rv.json['statistics_url'].endswith('&var-asn=29429')
+    assert rv.json['asn_count'] == 1
+
+    # long lists are kept unless the dashboard reads the datasource
+    monkeypatch.setitem(current_app.config, 'GRAFANA_MAX_URL_ASNS', 0)
+    rv = client.get(url_for('cp.get_grafana', orgid=org.id))
+    assert rv.json['statistics_url'].endswith('&var-asn=29429')
+
+    monkeypatch.setitem(current_app.config, 'GRAFANA_ASN_DATASOURCE', True)
+    rv = client.get(url_for('cp.get_grafana', orgid=org.id))
+    assert rv.json['statistics_url'].endswith(
+        '&var-asnscope={}'.format(org.id))
+    assert rv.json['asn_count'] == 1
+
+    rv = client.post(url_for('cp.search_statistics_datasource'),
+                     json={'target': str(org.id)})
+    assert rv.status_code == 200
+    assert rv.json == ['29429']
+    rv = client.post(url_for('cp.search_statistics_datasource'),
+                     json={'target': 'all'})
+    assert '29429' in rv.json
+    rv = client.post(url_for('cp.search_statistics_datasource'),
+                     json={'target': 'nope'})
+    assert rv.status_code == 400
+
+
+def test_create_settings_same_asn(client):
+    for abbreviation in ('asn-org-1', 'asn-org-2'):
+        client.post(
+            url_for('cp.add_cp_organization'),
+            json=dict(abbreviation=abbreviation,
+                      full_name=abbreviation,
+                      parent_org_id=client.test_user.organization_id,
+                      ripe_handles=['ORG-AA83-RIPE'])
+        )
+        org = Organization.query.filter_by(abbreviation=abbreviation).one()
+        rv = client.post(url_for('cp.set_cp_settings',
+                                 ripe_org_hdl='ORG-AA83-RIPE', org_id=org.id),
+                         json=[{'asn': '29429'}])
+        assert rv.status_code == 201, 'an ASN may be set for several orgs'
+
+    for payload in ([1], ['asn'], [{'asn': '29429', 'notification_setting': 1}]):
+        rv = client.post(url_for('cp.set_cp_settings',
+                                 ripe_org_hdl='ORG-AA83-RIPE', org_id=org.id),
+                         json=payload)
+        assert rv.status_code == 422
@@ -0,0 +1,65 @@
+from flask import url_for, Response, current_app
+from requests.structures import CaseInsensitiveDict
+from app.cp import grafana
+
+
+class FakeUpstream(object):
+
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.content = body
+        self.headers = CaseInsensitiveDict({
+            'Content-Type': 'application/javascript',
+            'Content-Length': str(len(body))})
+
+    def close(self):
+        pass
+
+
+def fake_grafana(monkeypatch, body, status_code=200):
+    """Replace Grafana, return the list of fetched URLs"""
+    fetched = []
+
+    def fetch(url, exclude_headers=()):
+        fetched.append(url)
+        return FakeUpstream(body, status_code)
+
+    monkeypatch.setattr(grafana, '_fetch', fetch)
+    monkeypatch.setattr(grafana, '_stream', lambda resp, replace=False:
+                        Response(b'streamed', resp.status_code))
+    monkeypatch.setattr(grafana, '_assets', None)
+    return fetched
+
+
+def test_static_asset_cached(client, monkeypatch):
+    fetched = fake_grafana(monkeypatch, b'console.log(1)')
+    url = url_for('cp.proxy', dummy='public/build/app.js')
+
+    rv = client.get(url)
+    assert rv.status_code == 200
+    assert rv.data == b'console.log(1)'
+    etag = rv.headers['ETag']
+    assert len(grafana._assets) == 1
+
+    rv = client.get(url)
+    assert rv.data == b'console.log(1)'
+    rv = client.get(url, headers={'If-None-Match': etag})
+    assert rv.status_code == 304
+    assert fetched == ['public/build/app.js'], 'Grafana asked once'
+
+
+def test_static_asset_not_found_streamed(client, monkeypatch):
+    fake_grafana(monkeypatch, b'not found', 404)
+    rv = client.get(url_for('cp.proxy', dummy='public/build/missing.js'))
+    assert rv.status_code == 404
+    assert rv.data == b'streamed'
+    assert len(grafana._assets) == 0
+
+
+def test_static_asset_too_large_streamed(client, monkeypatch):
+    fake_grafana(monkeypatch, b'console.log(1)')
+    monkeypatch.setitem(current_app.config, 'GRAFANA_STATIC_MAX_SIZE', 4)
+    rv = client.get(url_for('cp.proxy', dummy='public/build/large.js'))
+    assert rv.status_code == 200
+    assert rv.data == b'streamed'
+    assert len(grafana._assets) == 0
@@ -24,6 +24,25 @@ def test_update_org(client):
     assert rv.status_code == 200
 
 
+def test_org_invalid_ip_range(client):
+    rv = client.post(
+        url_for('cp.add_cp_organization'),
+        json=dict(abbreviation="bad-range-org",
+                  full_name="bad-range-org",
+                  parent_org_id=client.test_user.organization_id,
+                  ip_ranges=['1.2.3.400/24'])
+    )
+    assert rv.status_code == 422
+
+    rv = client.put(
+        url_for('cp.update_cp_organization',
+                org_id=client.test_user.organization_id),
+        json=dict(full_name="Computer Emergency Response Team for EU new",
+                  ip_ranges=['not a range'])
+    )
+    assert rv.status_code == 422
+
+
 def test_return_orgs(client):
     client.api_user = find_user_by_name('EnergyOrg Admin')
     rv = client.get(url_for('cp.get_cp_organizations'))
@@ -37,6 +56,35 @@ def test_return_orgs(client):
         assert_msg(rv, key='abbreviation')
 
 
+def test_return_orgs_paged(client):
+    client.api_user = find_user_by_name('EnergyOrg Admin')
+    rv = client.get(url_for('cp.get_cp_organizations'))
+    all_ids = sorted(o['id'] for o in rv.json['organizations'])
+
+    paged_ids = []
+    keys = []
+    cursor = None
+    while True:
+        args = {'per_page': 1, 'count': 1}
+        if cursor:
+            args['cursor'] = cursor
+        rv = client.get(url_for('cp.get_cp_organizations', **args))
+        assert rv.status_code == 200
+        assert rv.json['count'] == len(all_ids)
+        assert len(rv.json['organizations']) <= 1
+        paged_ids.extend(o['id'] for o in rv.json['organizations'])
+        keys.extend((o['depth'], o['abbreviation'] or '', o['id'])
+                    for o in rv.json['organizations'])
+        cursor = rv.json['next_cursor']
+        if not cursor:
+            break
+    assert sorted(paged_ids) == all_ids, 'pages cover all organizations'
+    assert keys == sorted(keys), 'ordered by (depth, abbreviation, id)'
+
+    rv = client.get(url_for('cp.get_cp_organizations', cursor='foo'))
+    assert rv.status_code == 400
+
+
 ''' XXX
 def test_delete_org(client):
     client.api_user = find_user_by_name('EnergyOrg Admin')
@@ -1,6 +1,8 @@
 from app.models import Organization, FodyOrg_X_Organization, FodyOrganization
 from app.models import NotificationSetting, MembershipRole, User, OrganizationMembership
-from app import db
+from app import db, generations
+from app.utils.cache import DatabaseGenerationStore
+from sqlalchemy import event, text
 import datetime
 import pytest
 from pprint import pprint
@@ -24,6 +26,16 @@ def test_fody_organization():
     assert fody_org2.abusecs == ['abuse@drei.com'], 'abuse contacts'
 
 
+def test_fody_organization_load_many():
+    fody_orgs = FodyOrganization.load_many(
+        ['ORG-AGNS1-RIPE', 'ORG-CAGF1-RIPE', 'blablabla'])
+    assert sorted(fody_orgs) == ['ORG-AGNS1-RIPE', 'ORG-CAGF1-RIPE'], \
+        'unknown handles are left out'
+    assert '195.51.233.64/26' in fody_orgs['ORG-AGNS1-RIPE'].cidrs
+    assert fody_orgs['ORG-CAGF1-RIPE'].asns == ['12635', '15554', '25255']
+    assert fody_orgs['ORG-CAGF1-RIPE'].abusecs == ['abuse@drei.com']
+
+
 def test_link_fody_org():
     forg_x_org = FodyOrg_X_Organization();
     certorg = Organization.query.filter_by(abbreviation='cert').first()
@@ -49,6 +61,10 @@ def test_link_fody_org():
     current_ripe_handles = [ro.ripe_org_hdl for ro in certorg.ripe_organizations]
     assert current_ripe_handles == ['ORG-AAPA1-RIPE', 'ORG-CA1-RIPE']
 
+    with pytest.raises(AttributeError):
+        certorg.ripe_handles = ['ORG-CA1-RIPE', 'ORG-NONEXISTING-RIPE']
+    assert certorg.ripe_handles == ['ORG-AAPA1-RIPE', 'ORG-CA1-RIPE']
+
     certorg.ripe_handles = []
     db.session.add(certorg)
     db.session.commit()
@@ -88,6 +104,58 @@ def test_settings():
     #     print(ns.asn ,ns.cidr)
     pprint(forg_x_org.notification_settings)
 
+def test_upsert_notification_settings():
+    certorg = Organization.query.filter_by(abbreviation='cert').first()
+    forg_x_org = FodyOrg_X_Organization.query.filter_by(
+        organization_id=certorg.id, _ripe_org_hdl='ORG-CAGF1-RIPE').first()
+    if forg_x_org is None:
+        forg_x_org = FodyOrg_X_Organization()
+        forg_x_org.organization_id = certorg.id
+        forg_x_org.ripe_org_hdl = 'ORG-CAGF1-RIPE'
+        db.session.add(forg_x_org)
+        db.session.commit()
+
+    with pytest.raises(AttributeError):
+        forg_x_org.upsert_notification_settings([
+            {'asn': '15554', 'notification_interval': 1},
+            {'asn': '12635123123', 'notification_interval': 1}])
+    assert NotificationSetting.query.filter_by(
+        ripe_org_hdl='ORG-CAGF1-RIPE', asn='15554').count() == 0
+
+    forg_x_org.upsert_notification_settings([
+        {'asn': '15554', 'notification_interval': 11},
+        {'asn': '25255', 'notification_interval': 12},
+        {'cidr': '94.245.192.0/18',
+         'notification_setting': {'notification_interval': '0815'}}])
+    db.session.commit()
+    forg_x_org.upsert_notification_settings([
+        {'asn': '15554', 'notification_interval': 21}])
+    db.session.commit()
+
+    nss = NotificationSetting.query.filter_by(
+        ripe_org_hdl='ORG-CAGF1-RIPE', organization_id=certorg.id)
+    intervals = {ns.asn or str(ns.cidr): ns.notification_interval
+                 for ns in nss}
+    assert intervals['15554'] == 21
+    assert intervals['25255'] == 12
+    assert intervals['94.245.192.0/18'] == 815
+    assert nss.filter_by(asn='15554').count() == 1
+
+
+def test_asns_for():
+    certorg = Organization.query.filter_by(abbreviation='cert').first()
+    certorg.ripe_handles = ['ORG-CAGF1-RIPE']
+    db.session.commit()
+    asns = FodyOrg_X_Organization.asns_for([certorg.id])
+    assert '12635' in asns
+    assert list(asns) == sorted(set(asns), key=int)
+    assert FodyOrg_X_Organization.asns_for([certorg.id]) is asns
+
+    certorg.ripe_handles = []
+    db.session.commit()
+    assert FodyOrg_X_Organization.asns_for([certorg.id]) == ()
+
+
 def test_contact_abusec():
     # https://github.com/certat/do-portal/wiki
     # GET /api/v1/contact?netblock=1.2.3.0/24
@@ -165,3 +233,119 @@ def test_contact_abusec():
     assert notification['notification_setting']['ripe_org_hdl'] == 'ORG-CAGF1-RIPE', 'cidr'
 
 
+
+
+def test_fody_organization_cache():
+    FodyOrganization.cache.clear()
+    FodyOrganization.load_many(['ORG-CAGF1-RIPE', 'blablabla'])
+    hits = FodyOrganization.cache.hits
+    fody_orgs = FodyOrganization.load_many(['ORG-CAGF1-RIPE', 'blablabla'])
+    assert FodyOrganization.cache.hits == hits + 2, 'known and unknown cached'
+    assert list(fody_orgs) == ['ORG-CAGF1-RIPE']
+
+    generations.bump('fody')
+    misses = FodyOrganization.cache.misses
+    FodyOrganization.load_many(['ORG-CAGF1-RIPE'])
+    assert FodyOrganization.cache.misses == misses + 1, 'reloaded after bump'
+
+
+def test_contact_for_asn_without_round_trips(monkeypatch):
+    # the production backend, generations are read from the database
+    monkeypatch.setattr(generations, 'store', DatabaseGenerationStore(db))
+    NotificationSetting.contact_for_asn('AS29429')
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for _ in range(3):
+            NotificationSetting.contact_for_asn('AS29429')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert statements == [], 'repeated lookups are served from memory'
+
+
+NESTED_NETWORKS = (
+    # organisation id, handle, network id, network
+    (990001, 'ORG-TESTOUTER-RIPE', 990001, '198.51.100.0/24'),
+    (990002, 'ORG-TESTINNER-RIPE', 990002, '198.51.100.128/25'),
+)
+
+
+def _load_nested_networks(insert):
+    if insert:
+        for org_id, handle, net_id, network in NESTED_NETWORKS:
+            params = {'b_org_id': org_id, 'b_handle': handle,
+                      'b_net_id': net_id, 'b_network': network}
+            db.session.execute(
+                text("""insert into fody.organisation_automatic
+                       (organisation_automatic_id, name, ripe_org_hdl,
+                        import_source, import_time)
+                   values (:b_org_id, :b_handle, :b_handle, 'test', now())
+                """), params)
+            db.session.execute(
+                text("""insert into fody.network_automatic
+                       (network_automatic_id, address, import_source,
+                        import_time)
+                   values (:b_net_id, :b_network, 'test', now())
+                """), params)
+            db.session.execute(
+                text("""insert into fody.organisation_to_network_automatic
+                       (organisation_automatic_id, network_automatic_id,
+                        import_source, import_time)
+                   values (:b_org_id, :b_net_id, 'test', now())
+                """), params)
+    else:
+        ids = {'b_ids': [n[0] for n in NESTED_NETWORKS]}
+        db.session.execute(
+            text("""delete from fody.organisation_to_network_automatic
+                where organisation_automatic_id = any(:b_ids)"""), ids)
+        db.session.execute(
+            text("""delete from fody.network_automatic
+                where network_automatic_id = any(:b_ids)"""), ids)
+        db.session.execute(
+            text("""delete from fody.organisation_automatic
+                where organisation_automatic_id = any(:b_ids)"""), ids)
+    FodyOrganization.refresh_abuse_contacts()
+    db.session.commit()
+    generations.bump('fody')
+
+
+def test_most_specific_network_wins():
+    _load_nested_networks(True)
+    try:
+        handle, _ = FodyOrganization.contacts_for_cidr('198.51.100.200')
+        assert handle == 'ORG-TESTINNER-RIPE', 'the /25 is more specific'
+        handle, _ = FodyOrganization.contacts_for_cidr('198.51.100.128/26')
+        assert handle == 'ORG-TESTINNER-RIPE'
+        handle, _ = FodyOrganization.contacts_for_cidr('198.51.100.10')
+        assert handle == 'ORG-TESTOUTER-RIPE', 'outside the /25'
+        handle, _ = FodyOrganization.contacts_for_cidr('198.51.100.0/24')
+        assert handle == 'ORG-TESTOUTER-RIPE'
+    finally:
+        _load_nested_networks(False)
+
+
+def test_contact_deleted_abusec():
+    cidr = '94.245.192.0/18'
+    organization_id = NotificationSetting.contact_for_netblock(
+        cidr)['notification_setting']['organization_id']
+
+    oxu = OrganizationMembership(
+            user=User.query.filter_by(name='eorgmaster').one(),
+            membership_role=MembershipRole.query.filter_by(name='abuse-c').one(),
+            organization=Organization.get(organization_id),
+            email='deletedabusec@local.com'
+            )
+    db.session.add(oxu)
+    db.session.commit()
+    assert 'deletedabusec@local.com' in \
+        NotificationSetting.contact_for_netblock(cidr)['abusecs']
+
+    oxu.deleted = 1
+    db.session.commit()
+    abusecs = NotificationSetting.contact_for_netblock(cidr)['abusecs']
+    assert 'deletedabusec@local.com' not in abusecs, 'deleted abuse-c'
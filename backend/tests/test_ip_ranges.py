@@ -18,6 +18,20 @@ def test_update_ip_range(client):
     assert rv.status_code == 200
 
 
+def test_invalid_ip_range(client):
+    rv = client.post(
+        url_for('api.add_ip_range'),
+        json=dict(ip_range='1.2.3.400/24', organization_id=1)
+    )
+    assert rv.status_code == 422
+
+    rv = client.put(
+        url_for('api.update_ip_range', range_id=1),
+        json=dict(ip_range='not a range', organization_id=1)
+    )
+    assert rv.status_code == 422
+
+
 def test_read_ip_range(client):
     rv = client.get(url_for('api.get_ip_ranges'))
     assert_msg(rv, key='ip_ranges')
@@ -32,3 +46,20 @@ def test_delete_ip_range(client):
 
     rv = client.delete(url_for('api.delete_ip_range', range_id=666))
     assert rv.status_code == 404
+
+
+def test_ip_range_owner(client):
+    rv = client.get(url_for('api.get_ip_range_owner', address='212.8.189.18'))
+    assert_msg(rv, key='abbreviation')
+    assert rv.json['ip_range']['ip_range'] == '212.8.189.16/28'
+
+    rv = client.get(url_for('api.get_ip_range_owner', address='no ip'))
+    assert rv.status_code == 400
+
+
+def test_ip_range_is_normalized(client):
+    rv = client.post(
+        url_for('api.add_ip_range'),
+        json=dict(ip_range='10.20.30.40/16', organization_id=1)
+    )
+    assert rv.json['ip_range']['ip_range'] == '10.20.0.0/16'
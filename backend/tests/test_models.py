@@ -1,7 +1,8 @@
 from app.models import User, Organization, MembershipRole, \
-    OrganizationMembership, Country
+    OrganizationMembership, Country, AuthScope
 from app.models import FodyOrganization
 from app import db
+from sqlalchemy import event, text
 import datetime
 import pytest
 from pprint import pprint
@@ -294,3 +295,163 @@ def test_organization_notification_settings():
     for eorg_ripe_org in eorg.ripe_organizations:
         print(FodyOrganization(eorg_ripe_org.ripe_org_hdl).asns)
 '''        
+
+def test_org_closure_follows_parent_change():
+    admin = User.query.filter_by(_name="EnergyOrg Admin").first()
+    gas = Organization.query.filter_by(abbreviation='energyorg-gas').one()
+    energyorg = Organization.query.filter_by(abbreviation='energyorg').one()
+    eorg = Organization.query.filter_by(abbreviation='eorg').one()
+    assert admin.may_handle_organization(gas) is True
+
+    gas.parent_org_id = eorg.id
+    db.session.add(gas)
+    db.session.commit()
+    assert admin.may_handle_organization(gas) is False, \
+        'moved org is no longer in the subtree of energyorg'
+
+    gas.parent_org_id = energyorg.id
+    db.session.add(gas)
+    db.session.commit()
+    assert admin.may_handle_organization(gas) is True
+
+    with pytest.raises(AttributeError):
+        energyorg.parent_org_id = gas.id
+        db.session.add(energyorg)
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_auth_scope_cached_per_request(app):
+    admin = User.query.filter_by(_name="EnergyOrg Admin").first()
+    energyorg = Organization.query.filter_by(abbreviation='energyorg').one()
+    newuser = User(name='scoped user')
+    newuser.email = 'scoped_user@bla.com'
+    role = MembershipRole.query.filter_by(name='OrgAdmin').one()
+
+    with app.test_request_context():
+        scope = admin.auth_scope
+        assert admin.auth_scope is scope, 'scope is computed once'
+        assert energyorg.id in scope.org_ids
+
+        oxu = OrganizationMembership(
+            organization=energyorg,
+            user=newuser,
+            membership_role=role)
+        db.session.add(oxu)
+        db.session.add(newuser)
+        db.session.flush()
+
+        assert admin.auth_scope is not scope, 'membership write drops scope'
+        assert oxu.id in admin.auth_scope.membership_ids
+        assert admin.may_handle_user(newuser)
+    db.session.rollback()
+
+
+def test_auth_scope_overlapping_roots():
+    admin = User.query.filter_by(_name="EnergyOrg Admin").first()
+    electricity = Organization.query.filter_by(
+        abbreviation='energyorg-electricity').one()
+    transmission = Organization.query.filter_by(
+        abbreviation='energyorg-electricity-transmission').one()
+    role = MembershipRole.query.filter_by(name='OrgAdmin').one()
+    oxu = OrganizationMembership(
+        organization=electricity,
+        user=admin,
+        membership_role=role)
+    db.session.add(oxu)
+    db.session.flush()
+
+    scope = admin.auth_scope
+    assert electricity.id in scope.root_ids
+    ids = [o['id'] for o in scope.organizations]
+    assert len(ids) == len(set(ids)), 'nested roots are expanded once'
+    depths = {o['id']: o['depth'] for o in scope.organizations}
+    assert depths[electricity.id] == 0, 'a nested root is a root'
+    # reachable from energyorg (depth 2) and energyorg-electricity (depth 1)
+    assert depths[transmission.id] == 1, 'minimal depth below any root'
+    db.session.rollback()
+
+
+def test_org_path_follows_parent_change():
+    admin = User.query.filter_by(_name="EnergyOrg Admin").first()
+    gas = Organization.query.filter_by(abbreviation='energyorg-gas').one()
+    energyorg = Organization.query.filter_by(abbreviation='energyorg').one()
+    eorg = Organization.query.filter_by(abbreviation='eorg').one()
+    assert gas.path.endswith('{}.{}'.format(energyorg.id, gas.id))
+
+    gas.parent_org_id = eorg.id
+    db.session.add(gas)
+    db.session.commit()
+    assert gas.path == '{}.{}'.format(eorg.path, gas.id)
+    assert admin.may_handle_organization(gas) is False
+
+    gas.parent_org_id = energyorg.id
+    db.session.add(gas)
+    db.session.commit()
+    assert gas.path == '{}.{}'.format(energyorg.path, gas.id)
+    assert admin.may_handle_organization(gas) is True
+
+
+def test_may_handle_organization_without_path():
+    admin = User.query.filter_by(_name="EnergyOrg Admin").first()
+    gas = Organization.query.filter_by(abbreviation='energyorg-gas').one()
+    # as left by organizations inserted with SQL
+    db.session.execute(text("update organizations set path = null "
+                            "where id = :b_id"), {'b_id': gas.id})
+    AuthScope.cache.clear()
+    assert admin.may_handle_organization(gas) is True, 'scope fallback'
+    db.session.rollback()
+
+
+def test_serializer_plan_cached():
+    org = Organization.query.filter_by(abbreviation='cert').one()
+    data = org.serialize(exclude=('abbreviation',), extra=('ripe_handles',))
+    assert 'abbreviation' not in data
+    assert data['id'] == org.id
+    assert 'ripe_handles' in data
+    plan = Organization._serializer_plan(('abbreviation',),
+                                         ('ripe_handles',))
+    assert Organization._serializer_plan(['abbreviation'],
+                                         ['ripe_handles']) is plan
+    assert org.serialize()['abbreviation'] == 'cert'
+
+
+def test_loader_profiles():
+    org_id = Organization.query.filter_by(abbreviation='cert').one().id
+    db.session.expunge_all()
+    plain = Organization.query.get(org_id).serialize()
+
+    for profile in ('list', 'detail'):
+        db.session.expunge_all()
+        org = Organization.query.options(
+            *Organization.loader_profile(profile)).get(org_id)
+        assert org.serialize() == plain
+
+    db.session.expunge_all()
+    org = Organization.query.options(
+        *Organization.loader_profile('auth-check')).get(org_id)
+    assert 'full_name' not in org.__dict__
+    assert 'ip_ranges_' not in org.__dict__
+    assert Organization.loader_profile('unknown') == []
+
+
+def test_organization_preload():
+    db.session.expunge_all()
+    orgs = Organization.preload(Organization.query.all())
+    assert any(o.parent_org_id for o in orgs)
+
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for o in orgs:
+            if o.parent_org_id:
+                assert o.parent_org_abbreviation == o.parent_org.abbreviation
+            o.ripe_handles
+            o.group
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert statements == []
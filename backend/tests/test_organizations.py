@@ -1,5 +1,7 @@
+import json
 from flask import url_for
 from .conftest import assert_msg
+from app.models import Organization
 
 
 def test_create_org(client):
@@ -45,6 +47,32 @@ def test_return_orgs(client):
     assert_msg(rv, key='abbreviation')
 
 
+def test_return_orgs_streamed(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_STREAM_BATCH_SIZE', 2)
+    rv = client.get(url_for('api.get_organizations'))
+    assert rv.status_code == 200
+    orgs = rv.json['organizations']
+    assert len(orgs) == Organization.query.count()
+    assert len({o['id'] for o in orgs}) == len(orgs)
+    expected = Organization.query.get(orgs[0]['id']).serialize()
+    assert orgs[0] == json.loads(json.dumps(expected))
+
+
+def test_return_orgs_sparse_fields(client):
+    rv = client.get(url_for('api.get_organizations',
+                            fields='id,abbreviation'))
+    assert rv.status_code == 200
+    for org in rv.json['organizations']:
+        assert set(org) <= {'id', 'abbreviation'}
+
+    rv = client.get(url_for('api.get_organization', org_id=1,
+                            fields='id,ip_ranges'))
+    assert set(rv.json) <= {'id', 'ip_ranges'}
+
+    rv = client.get(url_for('api.get_organizations', fields='id,nope'))
+    assert rv.status_code == 400
+
+
 def test_org_queries(client):
     rv = client.post(url_for('api.query'))
     assert rv.status_code == 501
@@ -60,6 +88,22 @@ def test_is_constituent(client):
     assert rv.json['response']['212.8.189.18'] == 'CERT-EU'
 
 
+def test_is_constituent_stream(client):
+    rv = client.post(
+        url_for('api.stream_check_constituents'),
+        data='"212.8.189.18"\n1.2.3.4\n\n"no ip"\n"212.8.189.16/29"\n',
+        content_type='application/x-ndjson'
+    )
+    assert rv.status_code == 200
+    lines = [json.loads(l) for l in rv.data.decode().splitlines()]
+    assert [l['address'] for l in lines] == \
+        ['212.8.189.18', '1.2.3.4', 'no ip', '212.8.189.16/29']
+    assert lines[0]['abbreviation'] == 'CERT-EU'
+    assert lines[1]['organization_id'] is None
+    assert 'error' in lines[2]
+    assert lines[3]['organization_id'] == lines[0]['organization_id']
+
+
 def test_del_org(client):
     rv = client.delete(url_for('api.delete_organization', org_id=1))
     assert_msg(rv, value='Organization deleted')
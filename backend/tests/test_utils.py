@@ -16,3 +16,55 @@ def test_calc_hashes():
     assert digests.sha1 == '92cfceb39d57d914ed8b14d0e37643de0797ae56'
     assert digests.sha256 == \
         '73475cb40a568e8da8a045ced110137e159f890ac4da883b6b17dc651b3a8049'
+
+
+def test_lru_cache():
+    from app.utils.cache import LRUCache
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None, 'least recently used entry is evicted'
+    assert cache.get('c') == 3
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'size': 2, 'weight': 2,
+                             'maxsize': 2}
+
+
+def test_lru_cache_weighed():
+    from app.utils.cache import LRUCache
+    cache = LRUCache(maxsize=10, weigh=len)
+    cache.set('a', b'1234')
+    cache.set('b', b'1234')
+    cache.set('c', b'1234')
+    assert cache.get('a') is None, 'evicted to stay within 10 bytes'
+    assert cache.weight == 8
+    cache.set('d', b'12345678901')
+    assert cache.get('d') is None, 'heavier than the whole cache'
+    assert cache.get('c') == b'1234'
+    cache.set('c', b'12')
+    assert cache.weight == 6
+    cache.clear()
+    assert cache.weight == 0
+
+
+def test_interval_index_longest_prefix():
+    from app.utils.ipindex import IntervalIndex
+    index = IntervalIndex([('10.0.0.0/8', 'a'), ('10.1.0.0/16', 'b'),
+                           ('10.1.2.0/24', 'c'), ('2001:db8::/32', 'd')])
+    assert index.lookup('10.0.0.1') == 'a'
+    assert index.lookup('10.1.2.3') == 'c'
+    assert index.lookup('10.1.3.0') == 'b', 'back in the parent range'
+    assert index.lookup('10.1.2.0/23') == 'b', 'CIDR must fit entirely'
+    assert index.lookup('11.0.0.0') is None
+    assert index.lookup('2001:db8::1') == 'd'
+    assert index.lookup_many(['10.2.0.0', 'no ip']) == ['a', None]
+
+
+def test_replace_stream():
+    data = b'<a href="/grafana/x">/grafana/</a>/grafan'
+    for size in range(1, len(data) + 1):
+        chunks = [data[i:i + size] for i in range(0, len(data), size)]
+        rewritten = b''.join(
+            utils.replace_stream(chunks, b'/grafana/', b'/proxy/'))
+        assert rewritten == data.replace(b'/grafana/', b'/proxy/')
@@ -1,7 +1,14 @@
 #!/bin/bash
 set -e
 
+# organizations.path is an ltree, databases created later inherit the
+# extension from template1
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname template1 <<-EOSQL
+    CREATE EXTENSION IF NOT EXISTS ltree;
+EOSQL
+
 psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+    CREATE EXTENSION IF NOT EXISTS ltree;
     CREATE USER dope_test PASSWORD 'dope_test';
     CREATE DATABASE dope_test;
     GRANT ALL PRIVILEGES ON DATABASE dope_test TO dope_test;